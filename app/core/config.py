@@ -1,4 +1,5 @@
 import os
+from typing import List
 
 import tomli
 from pydantic import BaseModel
@@ -6,13 +7,60 @@ from pydantic import BaseModel
 MAX_TOKEN_LIMIT = 1048576
 
 
+class LLMEndpoint(BaseModel):
+    """One OpenAI-compatible endpoint from an [[endpoints]] table."""
+
+    api_base: str
+    api_key: str = ""
+    model: str
+    weight: float = 1
+    name: str = ""
+    timeout: float = 30  # Seconds per attempt before failing over
+
+
 class Settings(BaseModel):
     api_base: str
     api_key: str
     model: str
     max_tokens: int = MAX_TOKEN_LIMIT
     temperature: float = 0.6
+    # Endpoints requests are spread over; defaults to the single api/secret/model
+    endpoints: List[LLMEndpoint] = []
+    llm_hedge: bool = False  # Race a duplicate request when an endpoint is slower than its p95
+    llm_hedge_min_delay: float = 0.5  # Never hedge sooner than this many seconds
+    llm_max_connections: int = 100  # HTTP connection pool size per endpoint
+    llm_max_keepalive: int = 20
+    llm_timeout: float = 30  # Default per-attempt timeout of an endpoint, see "timeout"
     mcp_config_path: str = "mcp_config.json"
+    mcp_tools_ttl: float = 600  # Seconds before the MCP tool catalog is re-listed, 0 = never
+    mcp_connect_timeout: float = 30  # Default per-server connect timeout in seconds
+    mcp_startup_wait: float = 5  # Seconds startup waits for MCP before serving anyway
+    mcp_tool_timeout: float = 60  # Default per-call tool timeout, see "toolTimeout"
+    mcp_result_cache_ttl: float = 300  # Default TTL for servers with a "cache" entry
+    mcp_result_cache_size: int = 2048  # Tool results kept in memory
+    mcp_gateway_socket: str = ""  # Use the shared MCP gateway on this Unix socket; empty = own servers
+    db_pool_size: int = 4  # Threads running SQLite queries off the event loop
+    db_write_behind: bool = False  # Queue message writes and commit them in batches
+    db_write_queue_size: int = 10000  # Writers wait once this many writes are queued
+    db_write_batch_size: int = 500  # Most writes committed in one transaction
+    db_cache_size_mb: int = 64  # SQLite page cache per connection
+    db_mmap_size_mb: int = 256  # Database bytes read through mmap, 0 = off
+    maintenance_interval: float = 3600  # Seconds between maintenance passes, 0 = off
+    db_analyze_interval: float = 86400  # Seconds between full ANALYZE runs
+    chat_retention_days: float = 0  # Archive chats idle this long, 0 = keep forever
+    archive_dir: str = "./tempData/archive"  # Per-user gzip exports of archived chats
+    token_cache_ttl: float = 60  # Seconds a verified token is trusted without a DB lookup
+    token_cache_size: int = 10000
+    analyze_cache: bool = False  # Reuse analyze_intent responses for repeated queries
+    analyze_cache_ttl: float = 86400
+    analyze_cache_size: int = 1024  # Entries kept in memory; SQLite holds the rest
+    context_token_budget: int = 8000  # Prompt tokens available to chat history
+    context_max_messages: int = 10  # History rows fetched before fitting the budget
+    trace_file: str = ""  # Append trace spans as JSON lines here; empty = off
+    execute_timeout: float = 120  # Default end-to-end deadline of /execute in seconds
+    llm_turn_timeout: float = 60  # Longest a single LLM call may take
+    tool_result_inline_chars: int = 5000  # Larger tool results are stored, not sent
+    tool_result_preview_chars: int = 2000  # Preview sent along with a stored result's handle
 
     @classmethod
     def load(cls) -> "Settings":
@@ -23,13 +71,64 @@ class Settings(BaseModel):
         with open(config_path, "rb") as f:
             data = tomli.load(f)
 
+        api_base = data.get("api", "https://api.openai.com/v1")
+        api_key = data.get("secret", "")
+        model = data.get("model", "gpt-4")
+        timeout = data.get("llm_timeout", 30)
+        endpoints = [
+            LLMEndpoint(
+                api_base=e.get("api", api_base),
+                api_key=e.get("secret", api_key),
+                model=e.get("model", model),
+                weight=e.get("weight", 1),
+                name=e.get("name", ""),
+                timeout=e.get("timeout", timeout),
+            )
+            for e in data.get("endpoints", [])
+        ] or [LLMEndpoint(api_base=api_base, api_key=api_key, model=model, timeout=timeout)]
+
         # Map config keys to Settings keys
         return cls(
-            api_base=data.get("api", "https://api.openai.com/v1"),
-            api_key=data.get("secret", ""),
-            model=data.get("model", "gpt-4"),
+            api_base=api_base,
+            api_key=api_key,
+            model=model,
             max_tokens=data.get("max_tokens", MAX_TOKEN_LIMIT),
             temperature=data.get("temperature", 0.6),
+            endpoints=endpoints,
+            llm_hedge=data.get("llm_hedge", False),
+            llm_hedge_min_delay=data.get("llm_hedge_min_delay", 0.5),
+            llm_max_connections=data.get("llm_max_connections", 100),
+            llm_max_keepalive=data.get("llm_max_keepalive", 20),
+            llm_timeout=timeout,
+            mcp_tools_ttl=data.get("mcp_tools_ttl", 600),
+            mcp_connect_timeout=data.get("mcp_connect_timeout", 30),
+            mcp_startup_wait=data.get("mcp_startup_wait", 5),
+            mcp_tool_timeout=data.get("mcp_tool_timeout", 60),
+            mcp_result_cache_ttl=data.get("mcp_result_cache_ttl", 300),
+            mcp_result_cache_size=data.get("mcp_result_cache_size", 2048),
+            mcp_gateway_socket=data.get("mcp_gateway_socket", ""),
+            db_pool_size=data.get("db_pool_size", 4),
+            db_write_behind=data.get("db_write_behind", False),
+            db_write_queue_size=data.get("db_write_queue_size", 10000),
+            db_write_batch_size=data.get("db_write_batch_size", 500),
+            db_cache_size_mb=data.get("db_cache_size_mb", 64),
+            db_mmap_size_mb=data.get("db_mmap_size_mb", 256),
+            maintenance_interval=data.get("maintenance_interval", 3600),
+            db_analyze_interval=data.get("db_analyze_interval", 86400),
+            chat_retention_days=data.get("chat_retention_days", 0),
+            archive_dir=data.get("archive_dir", "./tempData/archive"),
+            token_cache_ttl=data.get("token_cache_ttl", 60),
+            token_cache_size=data.get("token_cache_size", 10000),
+            analyze_cache=data.get("analyze_cache", False),
+            analyze_cache_ttl=data.get("analyze_cache_ttl", 86400),
+            analyze_cache_size=data.get("analyze_cache_size", 1024),
+            context_token_budget=data.get("context_token_budget", 8000),
+            context_max_messages=data.get("context_max_messages", 10),
+            trace_file=data.get("trace_file", ""),
+            execute_timeout=data.get("execute_timeout", 120),
+            llm_turn_timeout=data.get("llm_turn_timeout", 60),
+            tool_result_inline_chars=data.get("tool_result_inline_chars", 5000),
+            tool_result_preview_chars=data.get("tool_result_preview_chars", 2000),
         )
 
 
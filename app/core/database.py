@@ -1,22 +1,72 @@
+import asyncio
 import datetime
+import functools
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from peewee import (
+    BlobField,
     CharField,
     DateTimeField,
     ForeignKeyField,
+    IntegerField,
     Model,
     SqliteDatabase,
     TextField,
 )
 
+from app.core.config import settings
+from app.core.file_lock import lock_file
 from app.core.logging import logger
+from app.core.metrics import DB_SECONDS, timed
 
 # Ensure the app directory exists for the db file if we put it there,
 # put at ./tempData/genui.db for now
 if not os.path.exists("./tempData/"):
     os.makedirs("./tempData/")
-db = SqliteDatabase("./tempData/genui.db")
+db = SqliteDatabase(
+    "./tempData/genui.db",
+    pragmas={
+        "synchronous": "normal",  # Safe with WAL, avoids an fsync per commit
+        "busy_timeout": 5000,  # Wait for the write lock instead of failing
+        "cache_size": -settings.db_cache_size_mb * 1024,  # Negative: in KiB
+        "mmap_size": settings.db_mmap_size_mb * 1024 * 1024,
+    },
+)
+
+# Queries run here so they never block the event loop.
+# Peewee keeps one connection per thread, so each worker reuses its own.
+db_executor = ThreadPoolExecutor(
+    max_workers=settings.db_pool_size, thread_name_prefix="db"
+)
+
+
+def _run_with_connection(fn, *args, **kwargs):
+    db.connect(reuse_if_open=True)
+    return fn(*args, **kwargs)
+
+
+async def run_in_db(fn, *args, **kwargs):
+    """Runs a blocking peewee call on the DB thread pool."""
+    loop = asyncio.get_running_loop()
+    with timed(DB_SECONDS, "db", op=getattr(fn, "__name__", "query")):
+        return await loop.run_in_executor(
+            db_executor, functools.partial(_run_with_connection, fn, *args, **kwargs)
+        )
+
+
+def db_task(fn):
+    """
+    Turns a blocking function into a coroutine function that runs on the DB
+    thread pool. The original stays reachable as `.sync`.
+    """
+
+    @functools.wraps(fn)
+    async def wrapper(*args, **kwargs):
+        return await run_in_db(fn, *args, **kwargs)
+
+    wrapper.sync = fn
+    return wrapper
 
 
 class BaseModel(Model):
@@ -35,18 +85,62 @@ class Chat(BaseModel):
     user = ForeignKeyField(User, backref="chats")
     title = CharField(default="New Chat")
     created_at = DateTimeField(default=datetime.datetime.now)
+    # Maintained with every message insert, so listing chats needs no aggregates
+    last_message_at = DateTimeField(default=datetime.datetime.now)
+    message_count = IntegerField(default=0)
+    last_preview = CharField(default="")
+
+    class Meta:
+        # Serves a user's chats ordered by (last_message_at, id) without a sort
+        indexes = ((("user", "last_message_at", "id"), False),)
 
 
 class Message(BaseModel):
     chat = ForeignKeyField(Chat, backref="messages")
     role = CharField()  # 'user' or 'assistant'
-    content = TextField()  # JSON string or plain text
+    # "text": plain text in `content`; "ui" / "json": compressed JSON in
+    # `payload`, see app/services/message_codec.py
+    content_type = CharField(default="text")
+    content = TextField(default="")
+    payload = BlobField(null=True)
     created_at = DateTimeField(default=datetime.datetime.now)
 
+    class Meta:
+        # Serves per-chat reads ordered by (created_at, id) without a sort
+        indexes = ((("chat", "created_at", "id"), False),)
+
+
+class AnalyzeCacheEntry(BaseModel):
+    """Second tier of the analyze_intent response cache."""
+
+    key = CharField(primary_key=True)
+    response = TextField()  # UIResponse JSON
+    expires_at = DateTimeField(index=True)
+
 
 def init_db():
     logger.info("Initializing database and creating tables if not exist...")
-    db.connect()
-    tables = BaseModel.__subclasses__()
-    db.create_tables(tables, safe=True)
-    db.close()
+    # Imported here because the migrations module builds on the models above
+    from app.core.migrations import run_migrations
+
+    # VACUUM cannot run inside a transaction, so workers starting together
+    # take turns through a file lock and the later ones find the work done.
+    # Connecting only once it is held: SQLite caches auto_vacuum per connection.
+    with open("./tempData/genui.db.init.lock", "a") as lock:
+        lock_file(lock)
+        db.connect()
+        # WAL lets readers run alongside the single writer; the mode is persistent
+        db.pragma("journal_mode", "wal")
+        # Lets maintenance return the pages of deleted rows to the filesystem.
+        # Existing files only switch after a full VACUUM, done once here.
+        if db.pragma("auto_vacuum") != 2:
+            logger.info("Enabling incremental auto-vacuum (one-time VACUUM)...")
+            db.pragma("auto_vacuum", "incremental")
+            db.execute_sql("VACUUM")
+        run_migrations()
+        db.close()
+
+
+def shutdown_db():
+    """Waits for queued queries to finish and stops the DB thread pool."""
+    db_executor.shutdown(wait=True)
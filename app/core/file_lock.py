@@ -0,0 +1,31 @@
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows: msvcrt below
+    import msvcrt
+
+
+def lock_file(f, blocking: bool = True) -> bool:
+    """
+    Takes an exclusive lock on an open file, shared by all processes and
+    released when the file is closed. Returns False instead of waiting when
+    `blocking` is off and another process holds the lock.
+    """
+    if fcntl is not None:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            return False
+        return True
+    # msvcrt locks byte ranges from the current position, so always the first byte
+    f.seek(0)
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            if not blocking:
+                return False
+            time.sleep(0.1)
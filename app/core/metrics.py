@@ -0,0 +1,301 @@
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.logging import logger
+
+# Seconds; spans from sub-millisecond cache hits to multi-minute executions
+DEFAULT_BUCKETS = (
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120,
+)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # Updated from the DB threads too
+        registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[LabelValues, float] = {}
+        super().__init__(*args, **kwargs)
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        self.buckets = tuple(sorted(buckets))
+        # labels -> (bucket counts, sum, count)
+        self._values: Dict[LabelValues, List[Any]] = {}
+        super().__init__(*args, **kwargs)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                labels = _format_labels(self.labelnames, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+            plain = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{plain} {total}")
+            lines.append(f"{self.name}_count{plain} {count}")
+        return lines
+
+
+# A collector returns (name, type, help, [(labels, value), ...]) at scrape time
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class Registry:
+    """Metrics rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Collector] = []
+
+    def register(self, metric: _Metric):
+        self.metrics.append(metric)
+
+    def register_collector(self, collector: Collector):
+        """Adds values that are read from elsewhere (e.g. cache stats) on each scrape."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(
+                        f"{name}{_format_labels(list(labels), list(labels.values()))} {value}"
+                    )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- Request stages ---
+HTTP_SECONDS = Histogram(
+    "genui_http_request_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+AUTH_SECONDS = Histogram(
+    "genui_auth_lookup_seconds", "Token verification time", ["source"]
+)
+DB_SECONDS = Histogram(
+    "genui_db_seconds", "Database call time including the wait for a DB thread", ["op"]
+)
+LLM_SECONDS = Histogram(
+    "genui_llm_request_seconds", "LLM request time until the full response", ["endpoint", "kind"]
+)
+LLM_TTFT_SECONDS = Histogram(
+    "genui_llm_ttft_seconds", "LLM time to first token for streamed requests", ["endpoint"]
+)
+LLM_TOKENS = Counter(
+    "genui_llm_tokens_total", "Tokens reported in LLM usage", ["endpoint", "type"]
+)
+TOOL_SECONDS = Histogram(
+    "genui_mcp_tool_seconds", "MCP tool call time", ["server", "tool", "status"]
+)
+EXECUTE_TURNS = Histogram(
+    "genui_execute_turns", "LLM turns taken per plan_execution",
+    buckets=(1, 2, 3, 4, 5, 7, 10, 15, 20, 30),
+)
+
+
+def record_usage(endpoint: str, usage: Any):
+    """Counts the tokens of an OpenAI `usage` object, if the provider sent one."""
+    if usage is None:
+        return
+    LLM_TOKENS.inc(getattr(usage, "prompt_tokens", 0) or 0, endpoint=endpoint, type="prompt")
+    LLM_TOKENS.inc(
+        getattr(usage, "completion_tokens", 0) or 0, endpoint=endpoint, type="completion"
+    )
+
+
+# --- Trace spans ---
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "trace_id", default=None
+)
+_span_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+    "span_id", default=None
+)
+
+
+class SpanExporter:
+    """Appends finished spans as JSON lines to `trace_file`, if configured."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def export(self, record: Dict[str, Any]):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", buffering=1)
+            self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+span_exporter = SpanExporter(settings.trace_file)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Dict[str, Any]]:
+    """
+    Records a trace span around a block; nested spans become its children.
+    Yields the attribute dict so the block can add results to it.
+    Does nothing but yield when no trace_file is configured.
+    """
+    if not span_exporter.enabled:
+        yield attributes
+        return
+
+    trace_id = _trace_id.get()
+    root = trace_id is None
+    if root:
+        trace_id = uuid.uuid4().hex
+    parent_id = _span_id.get()
+    span_id = uuid.uuid4().hex[:16]
+    trace_token = _trace_id.set(trace_id) if root else None
+    span_token = _span_id.set(span_id)
+    start = time.time()
+    started = time.perf_counter()
+    error = None
+    try:
+        yield attributes
+    except BaseException as e:
+        error = repr(e)
+        raise
+    finally:
+        _span_id.reset(span_token)
+        if trace_token is not None:
+            _trace_id.reset(trace_token)
+        try:
+            span_exporter.export(
+                {
+                    "trace_id": trace_id,
+                    "span_id": span_id,
+                    "parent_id": parent_id,
+                    "name": name,
+                    "start": start,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                    "attributes": attributes,
+                    "error": error,
+                }
+            )
+        except Exception as e:
+            logger.warning(f"Could not export trace span: {e}")
+
+
+@contextmanager
+def timed(histogram: Histogram, span_name: str, **labels) -> Iterator[Dict[str, Any]]:
+    """
+    Observes a histogram and records a span for the same block. Labels can be
+    changed through the yielded dict; a "status" of "ok" becomes "error" if
+    the block raises.
+    """
+    start = time.perf_counter()
+    attributes = labels
+    try:
+        with span(span_name, **labels) as attributes:
+            yield attributes
+    except BaseException:
+        if attributes.get("status") == "ok":
+            attributes["status"] = "error"
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **attributes)
@@ -0,0 +1,120 @@
+from peewee import BlobField, CharField, DateTimeField, IntegerField
+from playhouse.migrate import SqliteMigrator, migrate
+
+from app.core.database import BaseModel, Chat, Message, db
+from app.core.logging import logger
+
+migrator = SqliteMigrator(db)
+
+# Ordered schema changes for databases created by older versions.
+# The schema version is kept in SQLite's `PRAGMA user_version`.
+MIGRATIONS = []
+
+
+def migration(fn):
+    MIGRATIONS.append(fn)
+    return fn
+
+
+@migration
+def add_message_chat_created_index():
+    """Composite index for per-chat, time-ordered message reads."""
+    migrate(migrator.add_index("message", ("chat_id", "created_at", "id"), False))
+
+
+@migration
+def add_chat_activity_columns():
+    """Denormalized activity columns for the chat list, backfilled from messages."""
+    # Imported here because chat_store imports the database module
+    from app.services.chat_store import make_preview
+    from app.services.ui_decoder import decode_stored_content
+
+    migrate(
+        migrator.add_column("chat", "last_message_at", DateTimeField(null=True)),
+        migrator.add_column("chat", "message_count", IntegerField(default=0)),
+        migrator.add_column("chat", "last_preview", CharField(default="")),
+    )
+    db.execute_sql(
+        """
+        UPDATE chat SET
+            message_count = (SELECT COUNT(*) FROM message WHERE message.chat_id = chat.id),
+            last_message_at = COALESCE(
+                (SELECT MAX(created_at) FROM message WHERE message.chat_id = chat.id),
+                created_at
+            )
+        """
+    )
+    for chat in Chat.select(Chat.id).where(Chat.message_count > 0):
+        last = (
+            Message.select(Message.content)
+            .where(Message.chat == chat.id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .first()
+        )
+        preview = make_preview(decode_stored_content(last.content))
+        Chat.update(last_preview=preview).where(Chat.id == chat.id).execute()
+    migrate(
+        migrator.add_not_null("chat", "last_message_at"),
+        migrator.add_index("chat", ("user_id", "last_message_at", "id"), False),
+    )
+
+
+@migration
+def add_message_content_type():
+    """Typed message storage; JSON contents move into compressed payloads."""
+    from app.services.message_codec import encode_content
+    from app.services.ui_decoder import decode_stored_content
+
+    migrate(
+        migrator.add_column("message", "content_type", CharField(default="text")),
+        migrator.add_column("message", "payload", BlobField(null=True)),
+    )
+    # Only JSON objects need converting; plain text rows are already "text"
+    last_id = 0
+    while True:
+        rows = list(
+            Message.select(Message.id, Message.content)
+            .where((Message.id > last_id) & Message.content.startswith("{"))
+            .order_by(Message.id)
+            .limit(500)
+        )
+        if not rows:
+            break
+        for row in rows:
+            decoded = decode_stored_content(row.content)
+            if not isinstance(decoded, str):
+                Message.update(**encode_content(decoded)).where(
+                    Message.id == row.id
+                ).execute()
+        last_id = rows[-1].id
+
+
+def run_migrations():
+    """
+    Creates missing tables and brings an existing database up to date.
+    A brand new database is created with the current schema directly.
+    """
+    latest = len(MIGRATIONS)
+    # Every step runs under the write lock and re-reads the version first,
+    # so workers starting together apply each change exactly once
+    with db.atomic("IMMEDIATE"):
+        if not db.table_exists("user"):
+            db.create_tables(BaseModel.__subclasses__(), safe=True)
+            db.pragma("user_version", latest)
+            return
+
+    # Migrate first: create_tables would also try to add indexes on
+    # columns that the migrations have not created yet
+    for index in range(db.pragma("user_version"), latest):
+        step = MIGRATIONS[index]
+        with db.atomic("IMMEDIATE"):
+            if db.pragma("user_version") > index:
+                continue  # Applied by another worker meanwhile
+            logger.info(f"Applying database migration {index + 1}: {step.__name__}")
+            step()
+            db.pragma("user_version", index + 1)
+
+    with db.atomic("IMMEDIATE"):
+        # Creates any table (and its indexes) that does not exist yet
+        db.create_tables(BaseModel.__subclasses__(), safe=True)
+        db.pragma("user_version", latest)
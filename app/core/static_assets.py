@@ -0,0 +1,189 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from fastapi.responses import FileResponse, Response
+
+from app.core.logging import logger
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip variants are built
+    brotli = None
+
+# Files up to this size are kept in memory; larger ones are streamed from disk
+INLINE_MAX_BYTES = 256 * 1024
+# Smaller files are not worth compressing
+COMPRESS_MIN_BYTES = 1024
+# A variant is only kept if it saves at least this fraction of the bytes
+COMPRESS_MIN_SAVING = 0.1
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "application/manifest+json",
+    "image/svg+xml",
+    "application/wasm",
+)
+# Vite puts content-hashed bundles into assets/, e.g. assets/index-BxC2l3a9.js
+HASHED_NAME = re.compile(r"[-.][A-Za-z0-9_-]{8,}\.[A-Za-z0-9]+$")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Preference order when a client accepts several encodings
+ENCODINGS = ("br", "gzip")
+PRECOMPRESSED_SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+
+@dataclass
+class Variant:
+    etag: str
+    size: int
+    body: Optional[bytes] = None  # None: served from `path`
+    path: str = ""
+
+
+@dataclass
+class Asset:
+    media_type: str
+    cache_control: str
+    # "identity", "gzip", "br"
+    variants: Dict[str, Variant] = field(default_factory=dict)
+
+
+def _media_type(path: str) -> str:
+    media_type, _ = mimetypes.guess_type(path)
+    return media_type or "application/octet-stream"
+
+
+def _accepted_encodings(header: str) -> set:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match requires
+    return any(tag.strip().removeprefix("W/") == etag for tag in header.split(","))
+
+
+class StaticAssets:
+    """
+    Manifest of the built frontend in `root`, built once at startup.
+    Every file gets a content-hash ETag; text files also get gzip (and brotli,
+    if installed) variants, unless the build already put .gz/.br files next
+    to them. Requests are answered from the manifest only, so paths outside
+    `root` can never be reached.
+    """
+
+    def __init__(self, root: str = "static"):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+
+    def load(self):
+        assets: Dict[str, Asset] = {}
+        root = os.path.realpath(self.root)
+        if not os.path.isdir(root):
+            logger.warning(f"Static directory '{self.root}' not found, no frontend is served.")
+            self.assets = assets
+            return
+
+        for directory, _, files in os.walk(root):
+            for name in files:
+                path = os.path.join(directory, name)
+                if name.endswith((".gz", ".br")) and os.path.exists(path[:-3]):
+                    continue  # A precompressed variant, picked up with its original
+                # Symlinks must not expose files from outside the static directory
+                real = os.path.realpath(path)
+                if os.path.commonpath([root, real]) != root or not os.path.isfile(real):
+                    continue
+                key = os.path.relpath(path, root).replace(os.sep, "/")
+                assets[key] = self._build(key, path)
+
+        self.assets = assets
+        inline = sum(
+            v.size for a in assets.values() for v in a.variants.values() if v.body is not None
+        )
+        logger.info(
+            f"Loaded {len(assets)} static assets ({inline / 1024:.0f} KiB held in memory)."
+        )
+
+    def _build(self, key: str, path: str) -> Asset:
+        media_type = _media_type(path)
+        immutable = key.startswith("assets/") and HASHED_NAME.search(key) is not None
+        asset = Asset(media_type, IMMUTABLE if immutable else REVALIDATE)
+
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:32]
+        inline = len(data) <= INLINE_MAX_BYTES
+        asset.variants["identity"] = Variant(
+            f'"{digest}"', len(data), data if inline else None, path
+        )
+
+        if len(data) < COMPRESS_MIN_BYTES or not media_type.startswith(COMPRESSIBLE_TYPES):
+            return asset
+        for encoding in ENCODINGS:
+            precompressed = path + PRECOMPRESSED_SUFFIX[encoding]
+            if os.path.isfile(precompressed):
+                with open(precompressed, "rb") as f:
+                    body = f.read()
+            elif encoding == "gzip":
+                body = gzip.compress(data, compresslevel=9, mtime=0)
+            elif brotli is not None:
+                body = brotli.compress(data, quality=11)
+            else:
+                continue
+            if len(body) <= len(data) * (1 - COMPRESS_MIN_SAVING):
+                asset.variants[encoding] = Variant(f'"{digest}-{encoding}"', len(body), body)
+        return asset
+
+    def get(self, path: str) -> Optional[Asset]:
+        if "\x00" in path or "\\" in path:
+            return None
+        key = posixpath.normpath("/" + path).lstrip("/")
+        return self.assets.get(key or "index.html")
+
+    def response(self, asset: Asset, headers) -> Response:
+        """Picks the best variant for Accept-Encoding and answers 304 when the ETag matches."""
+        encoding = "identity"
+        if len(asset.variants) > 1:
+            accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+            encoding = next((e for e in ENCODINGS if e in accepted and e in asset.variants), encoding)
+        variant = asset.variants[encoding]
+
+        response_headers = {"ETag": variant.etag, "Cache-Control": asset.cache_control}
+        if len(asset.variants) > 1:
+            response_headers["Vary"] = "Accept-Encoding"
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match and _etag_matches(if_none_match, variant.etag):
+            return Response(status_code=304, headers=response_headers)
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+        if variant.body is None:
+            return FileResponse(variant.path, media_type=asset.media_type, headers=response_headers)
+        return Response(variant.body, media_type=asset.media_type, headers=response_headers)
+
+
+static_assets = StaticAssets()
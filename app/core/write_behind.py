@@ -0,0 +1,150 @@
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from peewee import OperationalError
+
+from app.core.database import db, run_in_db
+from app.core.logging import logger
+
+WriteOp = Callable[[], None]
+# Backoff while another connection holds the write lock, in seconds
+RETRY_DELAY = 0.1
+RETRY_DELAY_MAX = 5
+
+
+def _is_busy(error: Exception) -> bool:
+    """Whether a write failed only because the database was locked."""
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+class WriteBehindQueue:
+    """
+    Runs blocking peewee writes on a writer task, committing everything that
+    queued up meanwhile in one transaction. `write` returns once the operation
+    is queued; readers call `wait_for(key)` first to see every write queued
+    under that key. The queue is bounded, so writers wait when the database
+    falls behind. Until `start` (or after `close`) writes run immediately.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.queue: Optional[asyncio.Queue] = None
+        self.task: Optional[asyncio.Task] = None
+        # key -> completion of the last write queued under it
+        self._last: Dict[Hashable, asyncio.Future] = {}
+        self.batches = 0
+        self.writes = 0
+
+    def start(self):
+        self.queue = asyncio.Queue(self.maxsize)
+        self.task = asyncio.create_task(self._run(self.queue))
+
+    async def write(self, op: WriteOp, *keys: Hashable):
+        if self.queue is None:
+            await run_in_db(self._write_batch, [op])
+            return
+
+        done = asyncio.get_running_loop().create_future()
+        for key in keys:
+            self._last[key] = done
+            done.add_done_callback(lambda _, key=key: self._forget(key, done))
+        await self.queue.put((op, done))
+
+    async def wait_for(self, key: Hashable):
+        """Waits until the writes queued under `key` so far are committed."""
+        done = self._last.get(key)
+        if done is not None:
+            # Writes commit in queue order, so the last one covers the earlier ones
+            await asyncio.shield(done)
+
+    def _forget(self, key: Hashable, done: asyncio.Future):
+        if self._last.get(key) is done:
+            del self._last[key]
+
+    async def _run(self, queue: asyncio.Queue):
+        while True:
+            batch: List[Tuple[WriteOp, asyncio.Future]] = [await queue.get()]
+            # Group commit: take whatever piled up during the previous commit
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                logger.error(f"Write-behind batch failed: {e!r}")
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _commit(self, batch: List[Tuple[WriteOp, asyncio.Future]]):
+        ops = [op for op, _ in batch]
+        try:
+            try:
+                await self._retry_busy(self._write_batch, ops)
+            except Exception as e:
+                # Keep the good writes: one bad row must not drop the whole batch
+                logger.warning(f"Batch of {len(ops)} writes failed ({e!r}), retrying one by one")
+                await self._retry_busy(self._write_each, ops)
+        finally:
+            self.batches += 1
+            self.writes += len(batch)
+            for _, done in batch:
+                if not done.done():
+                    done.set_result(None)
+
+    @staticmethod
+    async def _retry_busy(write: Callable[[List[WriteOp]], Any], ops: List[WriteOp]):
+        """
+        Runs `write(ops)` on the DB thread, waiting with backoff as long as the
+        database is locked (e.g. by a maintenance pass), so acknowledged writes
+        stay queued instead of being dropped.
+        """
+        delay = RETRY_DELAY
+        while True:
+            try:
+                return await run_in_db(write, ops)
+            except Exception as e:
+                if not _is_busy(e):
+                    raise
+                logger.warning(f"Database is locked, retrying {len(ops)} writes in {delay:g}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RETRY_DELAY_MAX)
+
+    @staticmethod
+    def _write_batch(ops: List[WriteOp]):
+        # IMMEDIATE takes the write lock up front instead of upgrading from a
+        # read lock, which SQLite can refuse with "database is locked"
+        with db.atomic("IMMEDIATE"):
+            for op in ops:
+                op()
+
+    @staticmethod
+    def _write_each(ops: List[WriteOp]):
+        # Consumes `ops`, so a retry after "database is locked" resumes here
+        while ops:
+            try:
+                with db.atomic("IMMEDIATE"):
+                    ops[0]()
+            except Exception as e:
+                if _is_busy(e):
+                    raise
+                logger.error(f"Dropped a queued write: {e!r}")
+            del ops[0]
+
+    async def close(self):
+        """Commits everything still queued and stops the writer task."""
+        if self.queue is None:
+            return
+        # Later writes run immediately; the writer stops once the queue is empty
+        queue, self.queue = self.queue, None
+        await queue.join()
+        self.task.cancel()
+        await asyncio.gather(self.task, return_exceptions=True)
+        logger.info(f"Write-behind queue flushed ({self.writes} writes in {self.batches} batches).")
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "writes": self.writes,
+            "batches": self.batches,
+        }
@@ -1,13 +1,18 @@
-import os
+import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import Response
 
-from app.core.database import init_db
+from app.core.config import settings
+from app.core.database import init_db, shutdown_db
 from app.core.logging import setup_logging
+from app.core.metrics import HTTP_SECONDS, registry, span_exporter, timed
+from app.core.static_assets import static_assets
 from app.routers import api
+from app.services.chat_store import chat_writer
+from app.services.maintenance import maintenance_service
 from app.services.mcp_manager import mcp_service
 
 # Setup logging
@@ -16,11 +21,24 @@ setup_logging()
 
 async def startup_event():
     init_db()
-    await mcp_service.load_config_and_connect()
+    # Hashing and compressing the frontend bundle is blocking work
+    await asyncio.to_thread(static_assets.load)
+    if settings.db_write_behind:
+        chat_writer.start()
+    if maintenance_service.enabled:
+        maintenance_service.start()
+    await mcp_service.start(wait=settings.mcp_startup_wait)
 
 
 async def shutdown_event():
+    # Their results are saved through the MCP sessions, write queue and DB below
+    await api.wait_for_detached_executions()
     await mcp_service.cleanup()
+    await maintenance_service.close()
+    # Queued messages are committed before the DB pool stops
+    await chat_writer.close()
+    shutdown_db()
+    span_exporter.close()
 
 
 @asynccontextmanager
@@ -45,19 +63,39 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    # Streaming responses are measured until their headers are sent
+    with timed(
+        HTTP_SECONDS, "http.request", method=request.method, route="unmatched", status="500"
+    ) as stage:
+        response = await call_next(request)
+        # Label by route template, so path parameters don't create new series
+        route = request.scope.get("route")
+        if route is not None:
+            stage["route"] = route.path
+        stage["status"] = str(response.status_code)
+    return response
+
+
 app.include_router(api.router, prefix="/api/v1")
 
 
+# Registered before the SPA catch-all, which would otherwise answer it
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.get("/{full_path:path}")
-async def serve_spa(full_path: str):
+async def serve_spa(full_path: str, request: Request):
     # Ensure we don't return HTML for missing API endpoints
     if full_path.startswith("api/"):
         raise HTTPException(status_code=404, detail="Not Found")
 
-    # Check if the file exists in the static directory
-    file_path = os.path.join("static", full_path)
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return FileResponse(file_path)
-
-    # Fallback to index.html for SPA (Vue Router history mode)
-    return FileResponse("static/index.html")
+    # Look the file up in the manifest of the static directory,
+    # falling back to index.html for SPA (Vue Router history mode)
+    asset = static_assets.get(full_path) or static_assets.get("index.html")
+    if asset is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return static_assets.response(asset, request.headers)
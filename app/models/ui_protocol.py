@@ -1,6 +1,6 @@
-from typing import Any, List, Literal, Optional, Union
+from typing import Annotated, Any, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, TypeAdapter
 
 
 class UIComponent(BaseModel):
@@ -85,18 +85,22 @@ class Switch(UIComponent):
     default_value: bool = False
 
 
-# Union of all component types
-ComponentType = Union[
-    Input,
-    Select,
-    DatePicker,
-    MultiSelect,
-    Button,
-    MapPin,
-    RangeSlider,
-    VisualPicker,
-    Stepper,
-    Switch,
+# Union of all component types, discriminated by `type` so validation
+# jumps straight to the matching model instead of trying each in turn
+ComponentType = Annotated[
+    Union[
+        Input,
+        Select,
+        DatePicker,
+        MultiSelect,
+        Button,
+        MapPin,
+        RangeSlider,
+        VisualPicker,
+        Stepper,
+        Switch,
+    ],
+    Field(discriminator="type"),
 ]
 
 
@@ -107,3 +111,8 @@ class UIResponse(BaseModel):
     message: Optional[str] = Field(
         None, description="Direct answer or explanation if no UI is needed"
     )
+
+
+# Validators are built once; validate_json parses and validates in one pass
+component_adapter = TypeAdapter(ComponentType)
+ui_response_adapter = TypeAdapter(UIResponse)
@@ -1,14 +1,24 @@
+import asyncio
 import json
 from typing import Any, Dict, List, Optional, Union
 
 from fastapi import APIRouter, Depends, Header, HTTPException, Query
-from pydantic import BaseModel
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+from pydantic_core import to_json
 
-from app.core.database import Chat, Message, User
+from app.core.config import settings
+from app.core.database import Chat, User, run_in_db
 from app.core.logging import logger
+from app.core.metrics import AUTH_SECONDS, registry, timed
 from app.models.ui_protocol import UIResponse
 from app.services.auth import auth_service
+from app.services.chat_store import chat_store, decode_cursor, encode_cursor
+from app.services.context import context_builder
 from app.services.llm import OpenAIService
+from app.services.mcp_manager import mcp_service
+from app.services.message_codec import message_json
+from app.services.response_cache import analyze_cache
 
 router = APIRouter()
 llm_service = OpenAIService()
@@ -17,7 +27,12 @@ llm_service = OpenAIService()
 # --- Dependencies ---
 async def get_current_user(authorization: str = Header(...)) -> User:
     """Validate token and return current user."""
-    user = auth_service.verify_token(authorization)
+    with timed(AUTH_SECONDS, "auth", source="cache") as stage:
+        # Cache hits are answered on the event loop without a trip to the DB pool
+        user = auth_service.get_cached_user(authorization)
+        if user is None:
+            stage["source"] = "db"
+            user = await run_in_db(auth_service.load_token, authorization)
     if not user:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
     return user
@@ -38,66 +53,160 @@ class ChatInfo(BaseModel):
     chatId: str
     title: str
     created_at: str
+    last_message_at: str
+    message_count: int
+    last_preview: str
+    # Pass as `before` to get the chats after this one
+    cursor: str
 
 
 class HistoryItem(BaseModel):
     role: str
-    content: Union[str, Dict[str, Any], UIResponse]
+    content: Union[UIResponse, Dict[str, Any], str]
     created_at: str
+    cursor: str  # Pass as `before` to page further back
 
 
 class AnalyzeRequest(BaseModel):
     query: str
     chat_id: str
+    bypass_cache: bool = False  # Always ask the LLM, e.g. for chats that want fresh forms
 
 
 class ExecuteRequest(BaseModel):
     original_query: str
     form_data: Dict[str, Any]
     chat_id: str
+    # Seconds until a (possibly partial) answer is due; defaults to execute_timeout
+    timeout: Optional[float] = Field(None, gt=0, le=600)
 
 
 # --- Endpoints ---
 @router.post("/login", response_model=LoginResponse)
 async def login(request: LoginRequest):
-    token = auth_service.login_or_register(request.username, request.password)
+    token = await run_in_db(
+        auth_service.login_or_register, request.username, request.password
+    )
     if not token:
         raise HTTPException(status_code=401, detail="Incorrect password")
 
     # Get user to return expiry (simplified)
-    user = User.get(User.token == token)
+    user = await run_in_db(User.get, User.token == token)
     return {"token": token, "expires_at": user.token_expires.isoformat()}
 
 
+def _chat_info(chat: Chat) -> Dict[str, Any]:
+    return {
+        "chatId": str(chat.id),
+        "title": chat.title,
+        "created_at": chat.created_at.isoformat(),
+        "last_message_at": chat.last_message_at.isoformat(),
+        "message_count": chat.message_count,
+        "last_preview": chat.last_preview,
+        "cursor": encode_cursor(chat.last_message_at, chat.id),
+    }
+
+
 @router.get("/chatList", response_model=List[ChatInfo])
-async def get_chat_list(user: User = Depends(get_current_user)):
-    chats = Chat.select().where(Chat.user == user).order_by(Chat.created_at.desc())
-    return [
-        {"chatId": str(c.id), "title": c.title, "created_at": c.created_at.isoformat()}
-        for c in chats
-    ]
+async def get_chat_list(
+    before: Optional[str] = Query(
+        None, description="Cursor of a chat; returns chats less recently active"
+    ),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size"),
+    user: User = Depends(get_current_user),
+):
+    try:
+        cursor = decode_cursor(before) if before else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Most recently active first; without `limit` all chats are returned
+    chats = await chat_store.list_chats(user, limit=limit, before=cursor)
+    return [_chat_info(c) for c in chats]
 
 
 @router.post("/chat", response_model=ChatInfo)
 async def create_chat(user: User = Depends(get_current_user)):
     """Create a new chat session."""
-    chat = Chat.create(user=user, title="New Chat")
+    chat = await chat_store.create_chat(user)
+    return _chat_info(chat)
+
+
+def cache_stats() -> Dict[str, Any]:
     return {
-        "chatId": str(chat.id),
-        "title": chat.title,
-        "created_at": chat.created_at.isoformat(),
+        "token": auth_service.token_cache.stats(),
+        "analyze": analyze_cache.stats(),
+        "tool_results": mcp_service.result_cache.stats(),
+        "coalesced": {
+            "analyze": llm_service.analyze_flights.stats(),
+            "tools": mcp_service.tool_flights.stats(),
+        },
     }
 
 
+def cache_metrics():
+    """Cache counters for /metrics, read from the same stats as /stats/cache."""
+    stats = cache_stats()
+    analyze = stats["analyze"]
+    counts = {
+        "token": stats["token"],
+        "analyze": {
+            "hits": analyze["memory"]["hits"] + analyze["disk_hits"],
+            "misses": analyze["misses"],
+            "hit_rate": analyze["hit_rate"],
+        },
+        "tool_results": stats["tool_results"],
+    }
+    return [
+        (
+            f"genui_cache_{field}",
+            kind,
+            documentation,
+            [({"cache": name}, c[key]) for name, c in counts.items()],
+        )
+        for field, key, kind, documentation in (
+            ("hits_total", "hits", "counter", "Cache hits"),
+            ("misses_total", "misses", "counter", "Cache misses"),
+            ("hit_ratio", "hit_rate", "gauge", "Cache hit rate since start"),
+        )
+    ]
+
+
+registry.register_collector(cache_metrics)
+
+
+@router.get("/stats/cache")
+async def get_cache_stats(user: User = Depends(get_current_user)):
+    """Hit/miss counters of the in-process caches."""
+    return cache_stats()
+
+
+@router.get("/stats/llm")
+async def get_llm_stats(user: User = Depends(get_current_user)):
+    """Requests, errors, hedges and latency percentiles per LLM endpoint."""
+    return llm_service.router.stats()
+
+
+@router.get("/stats/mcp")
+async def get_mcp_stats(user: User = Depends(get_current_user)):
+    """Session pool sizes, load and queue-wait times per MCP server."""
+    return await mcp_service.pool_stats()
+
+
 @router.get("/history", response_model=List[HistoryItem])
 async def get_history(
     range: Optional[str] = Query(None, description="Range like [1, 5]"),
     chat_id: str = Query(..., description="Chat ID is required"),
+    before: Optional[str] = Query(
+        None, description="Cursor of a message; returns messages older than it"
+    ),
+    limit: Optional[int] = Query(
+        None, ge=1, le=500, description="Page size for cursor paging"
+    ),
     user: User = Depends(get_current_user),
 ):
-    try:
-        chat = Chat.get((Chat.id == chat_id) & (Chat.user == user))
-    except Chat.DoesNotExist:
+    chat = await chat_store.get_chat(chat_id, user)
+    if chat is None:
         raise HTTPException(status_code=404, detail="Chat not found")
 
     # Default range logic: [1, 5] (Latest 5 messages)
@@ -113,44 +222,67 @@ async def get_history(
         except Exception:
             pass  # Fallback to default
 
-    # Convert 1-based range to limit/offset
-    # range=[1, 5] means latest 1st to 5th message.
-    # Logic: Order by DESC, limit = end - start + 1, offset = start - 1
-    limit = end - start + 1
-    offset = start - 1
-
-    messages = (
-        Message.select()
-        .where(Message.chat == chat)
-        .order_by(Message.created_at.desc())
-        .limit(limit)
-        .offset(offset)
-    )
+    if before is not None or (limit is not None and not range):
+        # Cursor paging: `limit` messages older than `before` (or the latest ones)
+        try:
+            cursor = decode_cursor(before) if before else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        page_size, offset = limit or end - start + 1, 0
+    else:
+        # Convert 1-based range to limit/offset
+        # range=[1, 5] means latest 1st to 5th message.
+        # Logic: Order by DESC, limit = end - start + 1, offset = start - 1
+        cursor, page_size, offset = None, end - start + 1, start - 1
 
-    # Reverse to return in chronological order if desired, or keep DESC.
     # Usually history is displayed top-to-bottom (oldest first) in UI,
     # but "recent 5" usually means [Latest, ..., 5th Latest].
-    # Let's return them in chronological order for the slice requested.
-    msgs_list = list(messages)
-    msgs_list.reverse()
-
-    result = []
-    for m in msgs_list:
-        content_val = m.content
-        # Try to parse JSON content
-        try:
-            content_val = json.loads(m.content)
-        except Exception:
-            pass
+    # The slice comes back in chronological order.
+    msgs_list = await chat_store.recent_messages(
+        chat, limit=page_size, offset=offset, before=cursor
+    )
 
-        result.append(
+    # Stored contents are JSON already, so each item is put together from the
+    # serialized fields instead of decoding and re-serializing the contents
+    items = [
+        to_json(
             {
                 "role": m.role,
-                "content": content_val,
                 "created_at": m.created_at.isoformat(),
+                "cursor": encode_cursor(m.created_at, m.id),
             }
-        )
-    return result
+        )[:-1]
+        + b',"content":'
+        + message_json(m)
+        + b"}"
+        for m in msgs_list
+    ]
+    return Response(b"[" + b",".join(items) + b"]", media_type="application/json")
+
+
+async def _prepare_analyze(request: AnalyzeRequest, user: User):
+    """Validate the chat, store the user query and build the LLM history."""
+    # 1. Validate Chat Context
+    chat = await chat_store.get_chat(request.chat_id, user)
+    if chat is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    # 2. Fetch History for LLM (messages before the new query),
+    # fitted into the prompt token budget
+    recent_msgs = await chat_store.recent_messages(
+        chat, limit=settings.context_max_messages
+    )
+    history_context, _ = context_builder.build(recent_msgs)
+
+    # 3. Save User Query (also titles new chats)
+    await chat_store.add_user_query(chat, request.query)
+
+    return chat, history_context
+
+
+def _sse(event: str, data: Any) -> str:
+    """Format a single Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
 
 
 @router.post("/analyze", response_model=UIResponse)
@@ -158,88 +290,171 @@ async def analyze_intent(
     request: AnalyzeRequest, user: User = Depends(get_current_user)
 ):
     try:
-        # 1. Validate Chat Context
-        try:
-            chat = Chat.get((Chat.id == request.chat_id) & (Chat.user == user))
-        except Chat.DoesNotExist:
-            raise HTTPException(status_code=404, detail="Chat not found")
-
-        # Auto-update title for new chats
-        if chat.title == "New Chat":
-            new_title = (
-                (request.query[:20] + "...")
-                if len(request.query) > 20
-                else request.query
-            )
-            chat.title = new_title
-            chat.save()
-
-        # 2. Save User Query
-        Message.create(chat=chat, role="user", content=request.query)
-
-        # 3. Fetch History for LLM (Last 10 messages for context)
-        recent_msgs = (
-            Message.select()
-            .where(Message.chat == chat)
-            .order_by(Message.created_at.desc())
-            .offset(1)  # Skip the one we just added
-            .limit(10)
-        )
-
-        history_context = []
-        for m in reversed(list(recent_msgs)):
-            history_context.append({"role": m.role, "content": m.content})
+        chat, history_context = await _prepare_analyze(request, user)
 
         # 4. Call LLM
         ui_response = await llm_service.analyze_intent(
-            request.query, history=history_context
+            request.query,
+            history=history_context,
+            use_cache=not request.bypass_cache,
         )
 
         # 5. Save Assistant Response
-        Message.create(
-            chat=chat, role="assistant", content=ui_response.model_dump_json()
-        )
+        await chat_store.add_message(chat, "assistant", ui_response)
 
         return ui_response
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/analyze/stream")
+async def analyze_intent_stream(
+    request: AnalyzeRequest, user: User = Depends(get_current_user)
+):
+    """
+    SSE variant of /analyze.
+    Emits `component` events as each component is parsed, `message` events with
+    text deltas, then a `done` event carrying the full UIResponse.
+    """
+    chat, history_context = await _prepare_analyze(request, user)
+
+    async def event_stream():
+        try:
+            async for event, payload in llm_service.analyze_intent_stream(
+                request.query,
+                history=history_context,
+                use_cache=not request.bypass_cache,
+            ):
+                if event == "component":
+                    yield _sse("component", payload.model_dump(mode="json"))
+                elif event == "message":
+                    yield _sse("message", {"delta": payload})
+                elif event == "done":
+                    await chat_store.add_message(chat, "assistant", payload)
+                    yield _sse("done", payload.model_dump(mode="json"))
+        except Exception as e:
+            logger.error(f"Analyze stream error: {e}")
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _prepare_execute(request: ExecuteRequest, user: User):
+    """Validate the chat and build the LLM history."""
+    chat = await chat_store.get_chat(request.chat_id, user)
+    if chat is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    # We do NOT save 'original_query' again as user message, per instructions.
+    # We do NOT save 'form_data'.
+    # We just need history to give LLM context.
+    recent_msgs = await chat_store.recent_messages(
+        chat, limit=settings.context_max_messages
+    )
+    history_context, _ = context_builder.build(recent_msgs)
+    return chat, history_context
+
+
 @router.post("/execute")
 async def execute_request(
     request: ExecuteRequest, user: User = Depends(get_current_user)
 ):
     try:
-        try:
-            chat = Chat.get((Chat.id == request.chat_id) & (Chat.user == user))
-        except Chat.DoesNotExist:
-            raise HTTPException(status_code=404, detail="Chat not found")
-
         # 1. Fetch History
-        # We do NOT save 'original_query' again as user message, per instructions.
-        # We do NOT save 'form_data'.
-        # We just need history to give LLM context.
-        recent_msgs = (
-            Message.select()
-            .where(Message.chat == chat)
-            .order_by(Message.created_at.desc())
-            .limit(10)
-        )
-
-        history_context = []
-        for m in reversed(list(recent_msgs)):
-            history_context.append({"role": m.role, "content": m.content})
+        chat, history_context = await _prepare_execute(request, user)
 
         # 2. Call LLM
         result = await llm_service.plan_execution(
-            request.original_query, request.form_data, history=history_context
+            request.original_query,
+            request.form_data,
+            history=history_context,
+            timeout=request.timeout or settings.execute_timeout,
         )
 
         # 3. Save Assistant Result
-        Message.create(chat=chat, role="assistant", content=result)
+        await chat_store.add_message(chat, "assistant", result)
 
         return {"result": result}
     except Exception as e:
         logger.info(f"Analyze intent error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# Executions whose client disconnected; kept referenced until they are saved
+_detached_executions: set = set()
+
+
+def _detached_done(task: asyncio.Task):
+    _detached_executions.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Detached execution failed: {task.exception()}")
+
+
+async def wait_for_detached_executions():
+    """
+    Lets executions whose client disconnected finish and save their result
+    before shutdown, for at most execute_timeout seconds.
+    """
+    if not _detached_executions:
+        return
+    logger.info(f"Waiting for {len(_detached_executions)} detached executions to finish...")
+    _, pending = await asyncio.wait(set(_detached_executions), timeout=settings.execute_timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Cancelled {len(pending)} detached executions still running at shutdown.")
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+@router.post("/execute/stream")
+async def execute_request_stream(
+    request: ExecuteRequest, user: User = Depends(get_current_user)
+):
+    """
+    SSE variant of /execute.
+    Emits `turn_started`, `tool_call`, `tool_result` and `token` events while
+    the execution runs, then a `done` event carrying the result. The result is
+    saved like in /execute, even if the client disconnects before the end.
+    """
+    chat, history_context = await _prepare_execute(request, user)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run() -> str:
+        result = await llm_service.plan_execution(
+            request.original_query,
+            request.form_data,
+            history=history_context,
+            timeout=request.timeout or settings.execute_timeout,
+            on_event=lambda event, payload: events.put_nowait((event, payload)),
+        )
+        await chat_store.add_message(chat, "assistant", result)
+        return result
+
+    async def event_stream():
+        task = asyncio.create_task(run())
+        task.add_done_callback(lambda _: events.put_nowait(None))
+        try:
+            while (item := await events.get()) is not None:
+                yield _sse(*item)
+            yield _sse("done", {"result": task.result()})
+        except Exception as e:
+            logger.error(f"Execute stream error: {e}")
+            yield _sse("error", {"detail": str(e)})
+        finally:
+            if not task.done():
+                # Retrying would redo every turn, so let it finish and save
+                _detached_executions.add(task)
+                task.add_done_callback(_detached_done)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,17 +3,29 @@ import hashlib
 import secrets
 from typing import Optional
 
+from app.core.cache import TTLCache
+from app.core.config import settings
 from app.core.database import User, db
 
 
 class AuthService:
+    def __init__(self):
+        # token -> (user_id, username, token_expires)
+        # Entries never outlive token_expires; other worker processes may keep
+        # a replaced token for at most token_cache_ttl seconds.
+        self.token_cache = TTLCache(
+            maxsize=settings.token_cache_size, ttl=settings.token_cache_ttl
+        )
+
     def hash_password(self, password: str) -> str:
         return hashlib.sha256(password.encode()).hexdigest()
 
     def login_or_register(self, username, password) -> str:
         pwd_hash = self.hash_password(password)
 
-        with db.atomic():
+        # IMMEDIATE takes the write lock before the read, so concurrent logins
+        # queue on busy_timeout instead of failing to upgrade their read lock
+        with db.atomic("IMMEDIATE"):
             user = User.get_or_none(User.username == username)
 
             if user:
@@ -24,6 +36,8 @@ class AuthService:
                 # Register
                 user = User.create(username=username, password_hash=pwd_hash)
 
+            old_token = user.token
+
             # Generate Token
             token = secrets.token_hex(32)
             expires = datetime.datetime.now() + datetime.timedelta(days=7)
@@ -32,16 +46,51 @@ class AuthService:
             user.token_expires = expires
             user.save()
 
-            return token
+        # The previous token stops being valid once the new one is committed
+        if old_token:
+            self.token_cache.pop(old_token)
+
+        return token
+
+    def get_cached_user(self, token: str) -> Optional[User]:
+        """
+        Resolves a token from the in-memory cache without touching the database.
+        Returns None on a miss or if the token has expired.
+        """
+        if not token:
+            return None
+
+        cached = self.token_cache.get(token)
+        if cached is None:
+            return None
+
+        user_id, username, expires = cached
+        if expires < datetime.datetime.now():
+            self.token_cache.pop(token)
+            return None
+
+        return User(id=user_id, username=username, token=token, token_expires=expires)
 
     def verify_token(self, token: str) -> Optional[User]:
+        return self.get_cached_user(token) or self.load_token(token)
+
+    def load_token(self, token: str) -> Optional[User]:
+        """Looks the token up in the database and caches a valid result."""
         if not token:
             return None
 
         try:
             user = User.get(User.token == token)
-            if user.token_expires < datetime.datetime.now():
+            now = datetime.datetime.now()
+            if user.token_expires < now:
                 return None  # Expired
+
+            remaining = (user.token_expires - now).total_seconds()
+            self.token_cache.set(
+                token,
+                (user.id, user.username, user.token_expires),
+                ttl=min(settings.token_cache_ttl, remaining),
+            )
             return user
         except User.DoesNotExist:
             return None
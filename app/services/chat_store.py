@@ -0,0 +1,191 @@
+import base64
+import datetime
+import functools
+import json
+from typing import List, Optional, Tuple, Union
+
+from app.core.config import settings
+from app.core.database import Chat, Message, User, db_task
+from app.core.write_behind import WriteBehindQueue
+from app.models.ui_protocol import UIResponse
+from app.services.message_codec import StoredContent, encode_content
+from app.services.ui_decoder import decode_stored_content
+
+# Position of a row in (timestamp, id) order, used for keyset pagination
+Cursor = Tuple[datetime.datetime, int]
+
+# Length of Chat.last_preview
+PREVIEW_CHARS = 100
+
+
+def encode_cursor(timestamp: datetime.datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Parses a cursor from encode_cursor. Raises ValueError if malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        timestamp, row_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.datetime.fromisoformat(timestamp), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+def make_preview(content: StoredContent) -> str:
+    """Single-line text of a decoded message for the chat list."""
+    if isinstance(content, UIResponse):
+        text = content.message or ""
+    elif isinstance(content, str):
+        text = content
+    else:
+        text = json.dumps(content, ensure_ascii=False)
+    return " ".join(text.split())[:PREVIEW_CHARS]
+
+
+# Message inserts and title updates; started in the lifespan hook if enabled
+chat_writer = WriteBehindQueue(
+    maxsize=settings.db_write_queue_size, batch_size=settings.db_write_batch_size
+)
+
+
+class ChatStore:
+    """
+    Chat and message persistence.
+    Every public method runs on the DB thread pool and must be awaited.
+    With write-behind, reads first wait for the queued writes they depend on.
+    """
+
+    async def list_chats(
+        self,
+        user: User,
+        limit: Optional[int] = None,
+        before: Optional[Cursor] = None,
+    ) -> List[Chat]:
+        await chat_writer.wait_for(("user", user.id))
+        return await self._list_chats(user, limit, before)
+
+    @db_task
+    def _list_chats(
+        self,
+        user: User,
+        limit: Optional[int] = None,
+        before: Optional[Cursor] = None,
+    ) -> List[Chat]:
+        """
+        Returns the user's chats, most recently active first.
+        With `before`, only chats last active before that cursor are considered,
+        walking the (user_id, last_message_at, id) index.
+        """
+        query = Chat.select().where(Chat.user == user)
+        if before is not None:
+            last_message_at, chat_id = before
+            query = query.where(
+                (Chat.last_message_at < last_message_at)
+                | ((Chat.last_message_at == last_message_at) & (Chat.id < chat_id))
+            )
+        query = query.order_by(Chat.last_message_at.desc(), Chat.id.desc())
+        if limit is not None:
+            query = query.limit(limit)
+        return list(query)
+
+    @db_task
+    def create_chat(self, user: User) -> Chat:
+        return Chat.create(user=user, title="New Chat")
+
+    @db_task
+    def get_chat(self, chat_id: str, user: User) -> Optional[Chat]:
+        return Chat.get_or_none((Chat.id == chat_id) & (Chat.user == user))
+
+    async def add_user_query(self, chat: Chat, query: str) -> Message:
+        """
+        Stores the user's query, titling the chat after it if still untitled.
+        With write-behind the message is only queued and has no id yet.
+        """
+        title = None
+        # Auto-update title for new chats
+        if chat.title == "New Chat":
+            title = chat.title = (query[:20] + "...") if len(query) > 20 else query
+
+        message = Message(chat=chat, role="user", **encode_content(query))
+        await chat_writer.write(
+            functools.partial(self._insert, message, make_preview(query), title),
+            ("chat", chat.id),
+            ("user", chat.user_id),
+        )
+        return message
+
+    async def add_message(
+        self, chat: Chat, role: str, content: Union[UIResponse, str]
+    ) -> Message:
+        """Stores a reply; JSON text is classified here once instead of on every read."""
+        decoded = content if isinstance(content, UIResponse) else decode_stored_content(content)
+        message = Message(chat=chat, role=role, **encode_content(decoded))
+        # The chat list shows the new activity too
+        await chat_writer.write(
+            functools.partial(self._insert, message, make_preview(decoded)),
+            ("chat", chat.id),
+            ("user", chat.user_id),
+        )
+        return message
+
+    @staticmethod
+    def _insert(message: Message, preview: str, title: Optional[str] = None):
+        # Runs inside the writer's transaction, together with the chat's counters
+        if title is not None:
+            Chat.update(title=title).where(
+                (Chat.id == message.chat_id) & (Chat.title == "New Chat")
+            ).execute()
+        updated = Chat.update(
+            message_count=Chat.message_count + 1,
+            last_message_at=message.created_at,
+            last_preview=preview,
+        ).where(Chat.id == message.chat_id).execute()
+        if not updated:
+            # Archived meanwhile: raising rolls back instead of leaving an orphan row
+            raise ValueError(f"Chat {message.chat_id} no longer exists")
+        message.save(force_insert=True)
+
+    async def recent_messages(
+        self,
+        chat: Chat,
+        limit: int,
+        offset: int = 0,
+        before: Optional[Cursor] = None,
+    ) -> List[Message]:
+        # Read-your-writes: queued messages of this chat are committed first
+        await chat_writer.wait_for(("chat", chat.id))
+        return await self._recent_messages(chat, limit, offset, before)
+
+    @db_task
+    def _recent_messages(
+        self,
+        chat: Chat,
+        limit: int,
+        offset: int = 0,
+        before: Optional[Cursor] = None,
+    ) -> List[Message]:
+        """
+        Returns a window of the latest messages, oldest first.
+        With `before`, only messages older than that cursor are considered,
+        which walks the (chat_id, created_at, id) index instead of skipping rows.
+        """
+        query = Message.select().where(Message.chat == chat)
+        if before is not None:
+            created_at, message_id = before
+            query = query.where(
+                (Message.created_at < created_at)
+                | ((Message.created_at == created_at) & (Message.id < message_id))
+            )
+
+        messages = list(
+            query.order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(limit)
+            .offset(offset)
+        )
+        messages.reverse()
+        return messages
+
+
+chat_store = ChatStore()
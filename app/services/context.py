@@ -0,0 +1,143 @@
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.logging import logger
+from app.models.ui_protocol import UIResponse
+from app.services.message_codec import CONTENT_UI, decode_message, message_text
+
+try:
+    import tiktoken
+except ImportError:  # Optional: fall back to a character-based estimate
+    tiktoken = None
+
+# Per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD = 4
+# Messages kept verbatim (if they fit) before older ones get condensed
+KEEP_RECENT = 2
+# Older plain-text messages longer than this are cut to this many tokens
+CONDENSED_TEXT_TOKENS = 200
+
+_CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+_encoder = None
+
+
+def _get_encoder():
+    global _encoder
+    if _encoder is None and tiktoken is not None:
+        try:
+            _encoder = tiktoken.encoding_for_model(settings.model)
+        except Exception:
+            try:
+                _encoder = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:  # e.g. the BPE file cannot be downloaded
+                logger.warning(f"tiktoken unavailable, estimating tokens: {e}")
+                _encoder = False
+    return _encoder or None
+
+
+def count_tokens(text: str) -> int:
+    encoder = _get_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    # Estimate: CJK characters are roughly a token each, other text ~4 chars/token
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+@dataclass
+class ContextStats:
+    messages_in: int = 0
+    messages_out: int = 0
+    condensed: int = 0
+    dropped: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_in - self.tokens_out
+
+
+def summarize_form(response: UIResponse) -> str:
+    """One-line stand-in for a stored component form."""
+    fields = ", ".join(f"{c.label} ({c.type})" for c in response.components)
+    summary = f"[Asked the user to fill in a form: {fields}]"
+    if response.message:
+        summary += f" {response.message}"
+    return summary
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoder = _get_encoder()
+    if encoder is not None:
+        head = encoder.decode(encoder.encode(text, disallowed_special=())[:max_tokens])
+    else:
+        head = text[: max_tokens * 2]  # Conservative for mixed CJK/latin text
+    return head + " ...(truncated)"
+
+
+class ContextBuilder:
+    """
+    Fits chat history into a token budget for the LLM prompt.
+    The newest messages are kept verbatim; older ones are condensed
+    (forms become a one-line summary, long texts are cut) and the oldest
+    are dropped once the budget runs out.
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget if budget is not None else settings.context_token_budget
+
+    def condense(self, message: Any, content: str) -> str:
+        if message.content_type == CONTENT_UI:
+            decoded = decode_message(message)
+            if decoded.components:
+                return summarize_form(decoded)
+        return truncate_tokens(content, CONDENSED_TEXT_TOKENS)
+
+    def build(
+        self, messages: Sequence[Any]
+    ) -> Tuple[List[Dict[str, str]], ContextStats]:
+        """
+        Takes Message rows (oldest first) and returns the chat messages for the
+        LLM together with what was condensed, dropped and saved.
+        """
+        newest_first = list(reversed(messages))
+        texts = [message_text(m) for m in newest_first]
+        sizes = [count_tokens(text) + MESSAGE_OVERHEAD for text in texts]
+        stats = ContextStats(messages_in=len(sizes), tokens_in=sum(sizes))
+        remaining = self.budget
+        kept: List[Dict[str, str]] = []
+
+        for age, (m, content, tokens) in enumerate(zip(newest_first, texts, sizes)):
+            if age >= KEEP_RECENT or tokens > remaining:
+                condensed = self.condense(m, content)
+                if condensed != content:
+                    content = condensed
+                    tokens = count_tokens(content) + MESSAGE_OVERHEAD
+                    stats.condensed += 1
+
+            if tokens > remaining:
+                # Everything older is dropped too, so the history stays contiguous
+                stats.dropped = len(newest_first) - age
+                break
+
+            remaining -= tokens
+            stats.tokens_out += tokens
+            kept.append({"role": m.role, "content": content})
+
+        kept.reverse()
+        stats.messages_out = len(kept)
+        if stats.tokens_saved:
+            logger.info(
+                f"Context: kept {stats.messages_out}/{stats.messages_in} messages "
+                f"({stats.condensed} condensed, {stats.dropped} dropped), "
+                f"{stats.tokens_out} tokens, saved {stats.tokens_saved}"
+            )
+        return kept, stats
+
+
+context_builder = ContextBuilder()
@@ -1,8 +1,13 @@
+import asyncio
 import json
-import re
+import time
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple
 
-from openai import AsyncOpenAI
-from openai.types.chat import ChatCompletionMessageParam
+from openai.types.chat import (
+    ChatCompletionMessage,
+    ChatCompletionMessageFunctionToolCall,
+    ChatCompletionMessageParam,
+)
 from openai.types.chat.chat_completion_tool_union_param import (
     ChatCompletionToolUnionParam,
 )
@@ -10,21 +15,23 @@ from starlette.types import Message
 
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import EXECUTE_TURNS, span
+from app.core.singleflight import SingleFlight
 from app.models.ui_protocol import UIResponse
+from app.services.llm_router import LLMRouter
 from app.services.mcp_manager import mcp_service
+from app.services.response_cache import analyze_cache
+from app.services.tool_results import (
+    READ_TOOL_RESULT,
+    READ_TOOL_RESULT_TOOL,
+    normalize_tool_result,
+    tool_result_store,
+)
+from app.services.ui_decoder import decode_ui_response
+from app.services.ui_stream import UIStreamParser
 
 
-class OpenAIService:
-    def __init__(self):
-        self.client = AsyncOpenAI(base_url=settings.api_base, api_key=settings.api_key)
-        self.model = settings.model
-
-    async def analyze_intent(
-        self,
-        query: str,
-        history: list[ChatCompletionMessageParam] = None,  # type: ignore
-    ) -> UIResponse:
-        system_prompt = """
+ANALYZE_SYSTEM_PROMPT = """
         You are an expert AI Assistant capable of generating dynamic UIs.
         Your goal is to analyze the user's request.
 
@@ -45,74 +52,188 @@ class OpenAIService:
         Constraint: Output compact JSON without unnecessary whitespace to save tokens. Do not add markdown formatting.
         """
 
-        try:
-            messages: list[ChatCompletionMessageParam] = [
-                {"role": "system", "content": system_prompt}
-            ]
-            if history:
-                messages.extend(history)
-            messages.append({"role": "user", "content": query})
-
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                stream=False,
-                temperature=settings.temperature,
-                max_tokens=settings.max_tokens,
-                # response_format={"type": "json_object"} # Uncomment if supported by provider
-            )
-
-            if not response.choices:
-                if hasattr(response, "error_message") and getattr(
-                    response, "error_message"
-                ):
-                    error_msg = f"Provider Error: {getattr(response, 'error_message')} (Code: {getattr(response, 'error_code', 'Unknown')})"
-                    logger.error(error_msg)
-                    raise ValueError(error_msg)
-
-                logger.error(f"LLM Response has no choices: {response}")
-                raise ValueError("LLM returned no choices")
+# Seconds of the execution deadline kept back for the final (partial) answer
+ANSWER_RESERVE = 10
 
-            content = response.choices[0].message.content
+FINAL_ANSWER_PROMPT = (
+    "Time is up. Do not call any more tools. Answer as well as you can with the "
+    "information gathered so far, and say what could not be completed."
+)
 
-            if not content:
-                raise ValueError("LLM returned empty content")
 
-            content = re.sub(
-                r"<think>.*?</think>", "", content, flags=re.DOTALL
-            ).strip()
+class OpenAIService:
+    def __init__(self):
+        self.router = LLMRouter(settings.endpoints)
+        self.model = settings.model  # Part of the analyze cache key
+        # Identical analyze requests in flight at the same time share one LLM call
+        self.analyze_flights = SingleFlight()
 
-            # 2. Extract JSON from Markdown code blocks if present
-            code_block_match = re.search(
-                r"```json\s*(\{.*\})\s*```", content, re.DOTALL
+    async def analyze_intent(
+        self,
+        query: str,
+        history: list[ChatCompletionMessageParam] = None,  # type: ignore
+        use_cache: bool = True,
+    ) -> UIResponse:
+        try:
+            cache_key = self._analyze_cache_key(query, history, use_cache)
+            if cache_key:
+                cached = await analyze_cache.get(cache_key)
+                if cached is not None:
+                    logger.info("Analyze cache hit")
+                    return cached
+
+            flight_key = cache_key or analyze_cache.make_key(
+                query, history, self.model, settings.temperature
+            )
+            return await self.analyze_flights.do(
+                flight_key, lambda: self._request_analysis(query, history, cache_key)
             )
-            if code_block_match:
-                content = code_block_match.group(1)
-            else:
-                # 3. Fallback: Find the first outer-most JSON object
-                # This regex looks for a starting { and tries to match until the end,
-                # but cleaning the string first is usually safer.
-                json_match = re.search(r"\{.*\}", content, re.DOTALL)
-                if json_match:
-                    content = json_match.group(0)
-
-            logger.debug(f"DEBUG: Cleaned content for parsing: {content!r}")
-            data = json.loads(content)
-            return UIResponse(**data)
 
         except Exception as e:
             logger.error(f"Error in LLM analysis: {e}")
             # Fallback or re-raise
             raise e
 
+    async def _request_analysis(
+        self,
+        query: str,
+        history: list[ChatCompletionMessageParam] | None,
+        cache_key: str | None,
+    ) -> UIResponse:
+        messages = self._build_analyze_messages(query, history)
+
+        response = await self.router.create(
+            messages=messages,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+            # response_format={"type": "json_object"} # Uncomment if supported by provider
+        )
+
+        if not response.choices:
+            if hasattr(response, "error_message") and getattr(
+                response, "error_message"
+            ):
+                error_msg = f"Provider Error: {getattr(response, 'error_message')} (Code: {getattr(response, 'error_code', 'Unknown')})"
+                logger.error(error_msg)
+                raise ValueError(error_msg)
+
+            logger.error(f"LLM Response has no choices: {response}")
+            raise ValueError("LLM returned no choices")
+
+        content = response.choices[0].message.content
+
+        if not content:
+            raise ValueError("LLM returned empty content")
+
+        ui_response = decode_ui_response(content)
+        if cache_key:
+            await analyze_cache.set(cache_key, ui_response)
+        return ui_response
+
+    async def analyze_intent_stream(
+        self,
+        query: str,
+        history: list[ChatCompletionMessageParam] = None,  # type: ignore
+        use_cache: bool = True,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of analyze_intent.
+        Yields ("component", component) as soon as each component object closes,
+        ("message", delta) for the message text, and finally ("done", UIResponse).
+        """
+        cache_key = self._analyze_cache_key(query, history, use_cache)
+        if cache_key:
+            cached = await analyze_cache.get(cache_key)
+            if cached is not None:
+                logger.info("Analyze cache hit")
+                for component in cached.components:
+                    yield "component", component
+                if cached.message:
+                    yield "message", cached.message
+                yield "done", cached
+                return
+
+        messages = self._build_analyze_messages(query, history)
+
+        stream = self.router.stream(
+            messages=messages,
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+        )
+
+        parser = UIStreamParser()
+        chunks = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            chunks.append(delta)
+            for event in parser.feed(delta):
+                yield event
+
+        content = "".join(chunks)
+        if not content:
+            raise ValueError("LLM returned empty content")
+
+        # Prefer the object the parser already isolated, fall back to a full scrub
+        ui_response = decode_ui_response(parser.text if parser.done else content)
+        if cache_key:
+            await analyze_cache.set(cache_key, ui_response)
+        yield "done", ui_response
+
+    def _analyze_cache_key(
+        self, query: str, history: list | None, use_cache: bool
+    ) -> str | None:
+        if not (use_cache and analyze_cache.enabled):
+            return None
+        return analyze_cache.make_key(query, history, self.model, settings.temperature)
+
+    def _build_analyze_messages(
+        self, query: str, history: list[ChatCompletionMessageParam] | None
+    ) -> list[ChatCompletionMessageParam]:
+        messages: list[ChatCompletionMessageParam] = [
+            {"role": "system", "content": ANALYZE_SYSTEM_PROMPT}
+        ]
+        if history:
+            messages.extend(history)
+        messages.append({"role": "user", "content": query})
+        return messages
+
     async def plan_execution(
         self,
         original_query: str,
         form_data: dict,
         history: list[ChatCompletionMessageParam] = None,  # type: ignore
+        timeout: float | None = None,
+        on_event: Optional[Callable[[str, Any], None]] = None,
     ) -> str:
+        """
+        Runs the tool-calling loop within `timeout` seconds (execute_timeout by
+        default). Each LLM turn and tool call gets what is left of the budget;
+        when it runs out, the answer is built from what was gathered so far.
+        With `on_event`, progress is reported as it happens: ("turn_started",
+        ...), ("tool_call", ...), ("tool_result", ...) and ("token", ...) for
+        text as the LLM streams it.
+        """
+        loop = asyncio.get_running_loop()
+        budget = timeout or settings.execute_timeout
+        deadline = loop.time() + budget
+        # Turns and tools stop early enough to leave time for the final answer
+        work_deadline = deadline - min(ANSWER_RESERVE, budget / 4)
+
         # Get tools from MCP
-        tools: list[ChatCompletionToolUnionParam] = await mcp_service.get_openai_tools()
+        try:
+            tools: list[ChatCompletionToolUnionParam] = await asyncio.wait_for(
+                mcp_service.get_openai_tools(), work_deadline - loop.time()
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Timed out loading MCP tools, executing without them")
+            tools = []
+        if tools:
+            # Lets the LLM page through results too large to send inline
+            tools = [*tools, READ_TOOL_RESULT_TOOL]  # type: ignore
 
         system_prompt = f"""
         You are an orchestration agent.
@@ -143,44 +264,38 @@ class OpenAIService:
         )
 
         max_turns = 30
-        for _ in range(max_turns):
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                tools=tools if tools else [],
-                tool_choice="auto" if tools else [],
-                temperature=settings.temperature,
-                max_tokens=settings.max_tokens,
-            )
+        stopped = "max turns reached"
+        for turn in range(1, max_turns + 1):
+            remaining = work_deadline - loop.time()
+            if remaining <= 0:
+                stopped = "time budget exhausted"
+                break
+            if on_event:
+                on_event("turn_started", {"turn": turn})
+            try:
+                with span("llm.turn", turn=turn):
+                    message = await asyncio.wait_for(
+                        self._complete_turn(messages, tools, "auto", turn, on_event),
+                        min(settings.llm_turn_timeout, remaining),
+                    )
+            except asyncio.TimeoutError:
+                stopped = "LLM call timed out"
+                break
 
-            message = response.choices[0].message
             messages.append(message)
 
             # Check if there are tool calls
-            if message.tool_calls and hasattr(message.tool_calls, "function"):
+            if message.tool_calls:
                 logger.info(f"LLM requested {len(message.tool_calls)} tool calls")
-                for tool_call in message.tool_calls:
-                    function_name = tool_call.function.name
-                    arguments = json.loads(tool_call.function.arguments)
-
-                    logger.info(
-                        f"Executing tool: {function_name} with args: {arguments}"
+                # Independent calls run concurrently; gather keeps the original order
+                tool_timeout = work_deadline - loop.time()
+                contents = await asyncio.gather(
+                    *(
+                        self._run_tool_call(tool_call, tool_timeout, on_event)
+                        for tool_call in message.tool_calls
                     )
-
-                    try:
-                        # Call MCP Service
-                        result = await mcp_service.execute_tool(
-                            function_name, arguments
-                        )
-                        # Format result as string for LLM
-                        content = str(result)
-                        # Optional: limit result length if too huge
-                        if len(content) > 5000:
-                            content = content[:5000] + "...(truncated)"
-                    except Exception as e:
-                        logger.error(f"Tool execution error: {e}")
-                        content = f"Error executing tool {function_name}: {e}"
-
+                )
+                for tool_call, content in zip(message.tool_calls, contents):
                     messages.append(
                         {
                             "role": "tool",
@@ -190,6 +305,149 @@ class OpenAIService:
                     )
             else:
                 # No tool calls, meaning the model produced a final response
+                EXECUTE_TURNS.observe(turn)
                 return message.content or ""
 
-        return "Execution stopped (max turns reached) without final answer."
+        EXECUTE_TURNS.observe(turn)
+        return await self._final_answer(messages, tools, deadline, stopped, turn, on_event)
+
+    async def _complete_turn(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        tools: list[ChatCompletionToolUnionParam],
+        tool_choice: str,
+        turn: int,
+        on_event: Optional[Callable[[str, Any], None]],
+    ) -> ChatCompletionMessage:
+        """One LLM call of the execution loop, streamed when progress is reported."""
+        request = dict(
+            messages=messages,
+            tools=tools if tools else [],
+            tool_choice=tool_choice if tools else [],
+            temperature=settings.temperature,
+            max_tokens=settings.max_tokens,
+        )
+        if on_event is None:
+            response = await self.router.create(**request)
+            return response.choices[0].message
+
+        content = []
+        # index -> tool call assembled from its streamed fragments
+        calls: Dict[int, Dict[str, Any]] = {}
+        async for chunk in self.router.stream(**request):
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+            if delta.content:
+                content.append(delta.content)
+                on_event("token", {"turn": turn, "delta": delta.content})
+            for fragment in delta.tool_calls or []:
+                call = calls.setdefault(
+                    fragment.index,
+                    {"id": "", "type": "function", "function": {"name": "", "arguments": ""}},
+                )
+                if fragment.id:
+                    call["id"] = fragment.id
+                if fragment.function is not None:
+                    call["function"]["name"] += fragment.function.name or ""
+                    call["function"]["arguments"] += fragment.function.arguments or ""
+
+        return ChatCompletionMessage(
+            role="assistant",
+            content="".join(content) or None,
+            tool_calls=[
+                ChatCompletionMessageFunctionToolCall.model_validate(calls[i])
+                for i in sorted(calls)
+            ]
+            or None,
+        )
+
+    async def _final_answer(
+        self,
+        messages: list[ChatCompletionMessageParam],
+        tools: list[ChatCompletionToolUnionParam],
+        deadline: float,
+        reason: str,
+        turn: int = 0,
+        on_event: Optional[Callable[[str, Any], None]] = None,
+    ) -> str:
+        """Asks for an answer from what was gathered so far once the loop has to stop."""
+        logger.warning(f"Execution stopped ({reason}), asking for a partial answer")
+        remaining = deadline - asyncio.get_running_loop().time()
+        if remaining > 0:
+            try:
+                if on_event:
+                    on_event("turn_started", {"turn": turn + 1, "final": True})
+                message = await asyncio.wait_for(
+                    self._complete_turn(
+                        [*messages, {"role": "user", "content": FINAL_ANSWER_PROMPT}],
+                        tools,
+                        "none",
+                        turn + 1,
+                        on_event,
+                    ),
+                    remaining,
+                )
+                if message.content:
+                    return message.content
+            except Exception as e:
+                logger.error(f"Could not get a partial answer: {e!r}")
+
+        return f"Execution stopped ({reason}) without final answer."
+
+    async def _run_tool_call(
+        self,
+        tool_call,
+        timeout: float | None = None,
+        on_event: Optional[Callable[[str, Any], None]] = None,
+    ) -> str:
+        """Execute one tool call and format its result as a string for the LLM."""
+        function_name = tool_call.function.name
+        if on_event:
+            on_event(
+                "tool_call",
+                {
+                    "id": tool_call.id,
+                    "tool": function_name,
+                    "server": mcp_service.tools_map.get(function_name, {}).get("server"),
+                },
+            )
+        start = time.perf_counter()
+        failed = False
+        try:
+            arguments = json.loads(tool_call.function.arguments or "{}")
+
+            logger.info(f"Executing tool: {function_name} with args: {arguments}")
+
+            if function_name == READ_TOOL_RESULT:
+                content = await tool_result_store.read(
+                    str(arguments.get("handle", "")),
+                    int(arguments.get("offset", 0)),
+                    int(arguments.get("length", 4000)),
+                )
+                size = len(content)
+            else:
+                # Call MCP Service
+                result = await mcp_service.execute_tool(function_name, arguments, timeout)
+                text = normalize_tool_result(result)
+                # The full result's size, even when the LLM only gets a preview of it
+                size = len(text)
+                # Large results are stored out of band; the LLM gets a preview and handle
+                content = await tool_result_store.prepare(text)
+        except Exception as e:
+            logger.error(f"Tool execution error: {e}")
+            content = f"Error executing tool {function_name}: {e}"
+            size = len(content)
+            failed = True
+        if on_event:
+            on_event(
+                "tool_result",
+                {
+                    "id": tool_call.id,
+                    "tool": function_name,
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "size": size,
+                    "error": failed,
+                },
+            )
+        return content
@@ -0,0 +1,272 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+from openai import APIConnectionError, APIStatusError, AsyncOpenAI, DefaultAsyncHttpxClient
+
+from app.core.config import LLMEndpoint, settings
+from app.core.logging import logger
+from app.core.metrics import LLM_SECONDS, LLM_TTFT_SECONDS, record_usage, span
+
+# Latency samples kept per endpoint for the p95 hedge threshold
+LATENCY_WINDOW = 200
+# Samples needed before an endpoint's p95 is trusted for hedging
+HEDGE_MIN_SAMPLES = 20
+# Consecutive failures that put an endpoint at the back of the line
+MAX_FAILURES = 3
+# Seconds an endpoint stays at the back of the line after MAX_FAILURES
+COOLDOWN = 30
+# Status codes that mean the request itself is bad, so no endpoint would take it
+NO_FAILOVER_STATUS = {400, 422}
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class Endpoint:
+    """One OpenAI-compatible endpoint with its own client, health and latency window."""
+
+    def __init__(self, conf: LLMEndpoint, retries: int):
+        self.name = conf.name or f"{conf.model}@{conf.api_base}"
+        self.model = conf.model
+        self.weight = conf.weight
+        self.client = AsyncOpenAI(
+            base_url=conf.api_base,
+            api_key=conf.api_key,
+            max_retries=retries,
+            # Applies to each attempt; a timeout fails over to the next endpoint
+            timeout=conf.timeout,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=settings.llm_max_connections,
+                    max_keepalive_connections=settings.llm_max_keepalive,
+                )
+            ),
+        )
+        # kind ("stream" = time to first token, "complete" = full response) -> seconds
+        self.latency: Dict[str, deque] = {
+            "stream": deque(maxlen=LATENCY_WINDOW),
+            "complete": deque(maxlen=LATENCY_WINDOW),
+        }
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0  # Hedged duplicates sent to this endpoint
+        self.hedges_won = 0
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.down_until
+
+    def p95(self, kind: str) -> Optional[float]:
+        samples = self.latency[kind]
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return _percentile(list(samples), 0.95)
+
+    def record_success(self, kind: str, seconds: float):
+        self.latency[kind].append(seconds)
+        self.failures = 0
+
+    def record_failure(self):
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= MAX_FAILURES:
+            self.down_until = time.monotonic() + COOLDOWN
+
+    def stats(self) -> Dict[str, Any]:
+        result: Dict[str, Any] = {
+            "model": self.model,
+            "weight": self.weight,
+            "healthy": self.healthy,
+            "requests": self.requests,
+            "errors": self.errors,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+        }
+        for kind, samples in self.latency.items():
+            if samples:
+                result[f"{kind}_p50_ms"] = round(_percentile(list(samples), 0.5) * 1000)
+                result[f"{kind}_p95_ms"] = round(_percentile(list(samples), 0.95) * 1000)
+        return result
+
+
+class StreamStart:
+    """An opened stream plus the chunks read while waiting for its first token."""
+
+    def __init__(self, stream: Any, buffered: List[Any], endpoint: "Endpoint"):
+        self.stream = stream
+        self.buffered = buffered
+        self.endpoint = endpoint
+
+
+def _should_failover(error: BaseException) -> bool:
+    if isinstance(error, APIStatusError):
+        return error.status_code not in NO_FAILOVER_STATUS
+    return isinstance(error, APIConnectionError)  # Includes timeouts
+
+
+def _has_tokens(chunk: Any) -> bool:
+    if not chunk.choices:
+        return False
+    delta = chunk.choices[0].delta
+    return bool(delta.content or delta.tool_calls)
+
+
+class LLMRouter:
+    """
+    Spreads chat completions over the configured endpoints by weight.
+    Failed attempts fail over to the next endpoint, and with `llm_hedge` a
+    duplicate goes to the next endpoint once the first one is slower than
+    its own p95 (time to first token for streams).
+    """
+
+    def __init__(self, endpoints: List[LLMEndpoint]):
+        # With somewhere to fail over to, retrying the same endpoint only adds latency
+        retries = 0 if len(endpoints) > 1 else 2
+        self.endpoints = [Endpoint(conf, retries) for conf in endpoints]
+
+    def _order(self) -> List[Endpoint]:
+        """Weighted shuffle of the healthy endpoints, followed by the cooling-down ones."""
+        healthy = [e for e in self.endpoints if e.healthy]
+        ordered = []
+        while healthy:
+            pick = random.choices(healthy, weights=[e.weight for e in healthy])[0]
+            healthy.remove(pick)
+            ordered.append(pick)
+        return ordered + [e for e in self.endpoints if not e.healthy]
+
+    def _hedge_delay(self, endpoint: Endpoint, kind: str) -> Optional[float]:
+        if not settings.llm_hedge:
+            return None
+        p95 = endpoint.p95(kind)
+        if p95 is None:
+            return None
+        return max(p95, settings.llm_hedge_min_delay)
+
+    async def _attempt(
+        self, endpoint: Endpoint, kind: str, call: Callable[[Endpoint], Awaitable[Any]]
+    ) -> Any:
+        endpoint.requests += 1
+        start = time.monotonic()
+        with span("llm.attempt", endpoint=endpoint.name, kind=kind):
+            try:
+                result = await call(endpoint)
+            except Exception as e:
+                if _should_failover(e):
+                    endpoint.record_failure()
+                raise
+        elapsed = time.monotonic() - start
+        endpoint.record_success(kind, elapsed)
+        if kind == "stream":
+            LLM_TTFT_SECONDS.observe(elapsed, endpoint=endpoint.name)
+        else:
+            LLM_SECONDS.observe(elapsed, endpoint=endpoint.name, kind=kind)
+            record_usage(endpoint.name, getattr(result, "usage", None))
+        return result
+
+    async def _run(self, kind: str, call: Callable[[Endpoint], Awaitable[Any]]) -> Any:
+        queue = self._order()
+        pending: Dict[asyncio.Task, Endpoint] = {}
+        hedges: set[asyncio.Task] = set()
+        last_error: Optional[BaseException] = None
+        try:
+            while True:
+                if not pending:
+                    if not queue:
+                        raise last_error or RuntimeError("No LLM endpoint configured")
+                    endpoint = queue.pop(0)
+                    task = asyncio.create_task(self._attempt(endpoint, kind, call))
+                    pending[task] = endpoint
+
+                wait = None
+                if queue and len(pending) == 1:
+                    wait = self._hedge_delay(next(iter(pending.values())), kind)
+                done, _ = await asyncio.wait(
+                    pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    # Slower than its p95: race a duplicate on the next endpoint
+                    endpoint = queue.pop(0)
+                    endpoint.hedges += 1
+                    logger.info(f"Hedging LLM request to {endpoint.name} after {wait:.2f}s")
+                    task = asyncio.create_task(self._attempt(endpoint, kind, call))
+                    pending[task] = endpoint
+                    hedges.add(task)
+                    continue
+
+                for task in done:
+                    endpoint = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if task in hedges:
+                            endpoint.hedges_won += 1
+                        return task.result()
+                    if not _should_failover(error):
+                        raise error
+                    logger.warning(f"LLM endpoint {endpoint.name} failed: {error!r}")
+                    last_error = error
+        finally:
+            for task in pending:
+                task.cancel()
+            # A loser that finished in the same tick may hold an open stream
+            for task in pending:
+                if task.done() and not task.cancelled() and task.exception() is None:
+                    result = task.result()
+                    if isinstance(result, StreamStart):
+                        await result.stream.close()
+
+    async def create(self, **kwargs) -> Any:
+        """Non-streaming chat completion; `model` is filled in per endpoint."""
+
+        async def call(endpoint: Endpoint):
+            return await endpoint.client.chat.completions.create(
+                model=endpoint.model, **kwargs
+            )
+
+        return await self._run("complete", call)
+
+    async def stream(self, **kwargs) -> AsyncIterator[Any]:
+        """
+        Streaming chat completion. Failover and hedging apply until the first
+        token arrives; after that the stream is committed to one endpoint.
+        """
+
+        async def call(endpoint: Endpoint) -> StreamStart:
+            stream = await endpoint.client.chat.completions.create(
+                model=endpoint.model, stream=True, **kwargs
+            )
+            buffered = []
+            try:
+                async for chunk in stream:
+                    buffered.append(chunk)
+                    if _has_tokens(chunk):
+                        break
+            except BaseException:
+                await stream.close()
+                raise
+            return StreamStart(stream, buffered, endpoint)
+
+        started = time.monotonic()
+        start: StreamStart = await self._run("stream", call)
+        name = start.endpoint.name
+        try:
+            for chunk in start.buffered:
+                yield chunk
+            async for chunk in start.stream:
+                # Only sent by providers that report usage on streams
+                record_usage(name, getattr(chunk, "usage", None))
+                yield chunk
+            LLM_SECONDS.observe(time.monotonic() - started, endpoint=name, kind="stream")
+        finally:
+            await start.stream.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {e.name: e.stats() for e in self.endpoints}
@@ -0,0 +1,184 @@
+import asyncio
+import datetime
+import gzip
+import json
+import os
+import time
+from itertools import groupby
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.database import AnalyzeCacheEntry, Chat, Message, User, db, run_in_db
+from app.core.file_lock import lock_file
+from app.core.logging import logger
+from app.services.message_codec import message_json
+
+# Workers take turns through this file; it also records when each job last ran
+STATE_PATH = "./tempData/maintenance.json"
+# Chats archived (and deleted) per transaction
+ARCHIVE_BATCH = 50
+# How often a worker checks whether a pass is due
+CHECK_INTERVAL = 300
+
+
+def _archive_record(chat: Chat, messages: List[Message]) -> Dict[str, Any]:
+    return {
+        "id": chat.id,
+        "title": chat.title,
+        "created_at": chat.created_at.isoformat(),
+        "last_message_at": chat.last_message_at.isoformat(),
+        "messages": [
+            {
+                "role": m.role,
+                "content_type": m.content_type,
+                "content": json.loads(message_json(m)),
+                "created_at": m.created_at.isoformat(),
+            }
+            for m in messages
+        ],
+    }
+
+
+class MaintenanceService:
+    """
+    Keeps the SQLite database from growing forever: archives idle chats,
+    clears expired tokens and cache rows, returns free pages to the filesystem
+    and refreshes the query planner statistics.
+    Every worker runs the loop; a file lock makes only one of them do each pass.
+    """
+
+    def __init__(self):
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return settings.maintenance_interval > 0
+
+    def start(self):
+        self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(min(settings.maintenance_interval, CHECK_INTERVAL))
+            try:
+                await run_in_db(self.run_if_due)
+            except Exception as e:
+                logger.error(f"Database maintenance failed: {e!r}")
+
+    def run_if_due(self) -> bool:
+        """Runs a pass unless another worker is running one or ran one recently."""
+        os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+        with open(STATE_PATH, "a+", encoding="utf-8") as f:
+            if not lock_file(f, blocking=False):
+                return False
+            f.seek(0)
+            try:
+                state = json.loads(f.read() or "{}")
+            except ValueError:
+                state = {}
+
+            now = time.time()
+            if now - state.get("last_pass", 0) < settings.maintenance_interval:
+                return False
+            analyze = now - state.get("last_analyze", 0) >= settings.db_analyze_interval
+            self.run_pass(analyze)
+
+            state["last_pass"] = now
+            if analyze:
+                state["last_analyze"] = now
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps(state))
+        return True
+
+    def run_pass(self, analyze: bool = False):
+        start = time.perf_counter()
+        now = datetime.datetime.now()
+
+        tokens = (
+            User.update(token=None, token_expires=None)
+            .where(User.token_expires < now)
+            .execute()
+        )
+        cache_rows = (
+            AnalyzeCacheEntry.delete().where(AnalyzeCacheEntry.expires_at <= now).execute()
+        )
+        chats = messages = 0
+        if settings.chat_retention_days > 0:
+            cutoff = now - datetime.timedelta(days=settings.chat_retention_days)
+            chats, messages = self.archive_chats(cutoff)
+
+        # Only frees anything once auto_vacuum is incremental, see init_db
+        free_pages = db.pragma("freelist_count")
+        # The pragma works one page per step, so its rows must be consumed
+        db.execute_sql("PRAGMA incremental_vacuum").fetchall()
+        if analyze:
+            db.execute_sql("ANALYZE")
+        db.execute_sql("PRAGMA optimize")
+
+        logger.info(
+            f"Database maintenance: archived {chats} chats ({messages} messages), "
+            f"cleared {tokens} expired tokens and {cache_rows} cache rows, "
+            f"freed {free_pages} pages{', analyzed' if analyze else ''} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def archive_chats(self, cutoff: datetime.datetime) -> Tuple[int, int]:
+        """
+        Moves chats last active before `cutoff` into gzip JSON-lines files,
+        one per user, and deletes them. Each batch is written and synced before
+        its transaction deletes the rows, so a crash can at worst archive a
+        chat twice, never lose it.
+        """
+        chats = messages = 0
+        while True:
+            # IMMEDIATE: no message can be added to a chat between archiving and deleting it
+            with db.atomic("IMMEDIATE"):
+                batch = list(
+                    Chat.select()
+                    .where(Chat.last_message_at < cutoff)
+                    .order_by(Chat.user, Chat.id)
+                    .limit(ARCHIVE_BATCH)
+                )
+                if not batch:
+                    break
+                ids = [chat.id for chat in batch]
+                rows = list(
+                    Message.select()
+                    .where(Message.chat.in_(ids))
+                    .order_by(Message.chat, Message.created_at, Message.id)
+                )
+                by_chat = {
+                    chat_id: list(group)
+                    for chat_id, group in groupby(rows, key=lambda m: m.chat_id)
+                }
+                for user_id, user_chats in groupby(batch, key=lambda c: c.user_id):
+                    self._append_archive(
+                        user_id,
+                        [_archive_record(c, by_chat.get(c.id, [])) for c in user_chats],
+                    )
+                Message.delete().where(Message.chat.in_(ids)).execute()
+                Chat.delete().where(Chat.id.in_(ids)).execute()
+            chats += len(batch)
+            messages += len(rows)
+        return chats, messages
+
+    @staticmethod
+    def _append_archive(user_id: int, records: List[Dict[str, Any]]):
+        os.makedirs(settings.archive_dir, exist_ok=True)
+        path = os.path.join(settings.archive_dir, f"user_{user_id}.jsonl.gz")
+        data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        # Each append is a new gzip member; readers see one continuous stream
+        with open(path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="ab") as f:
+                f.write(data.encode())
+            raw.flush()
+            os.fsync(raw.fileno())
+
+    async def close(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+
+
+maintenance_service = MaintenanceService()
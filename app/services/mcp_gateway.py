@@ -0,0 +1,294 @@
+"""
+Shared MCP gateway for multi-worker deployments.
+
+    python -m app.services.mcp_gateway [--socket ./tempData/mcp_gateway.sock]
+
+One process owns the MCP server sessions and answers tool listings and tool
+calls from the API workers over a Unix domain socket. Workers use it instead
+of starting their own servers when `mcp_gateway_socket` in config.toml
+points at the same socket.
+
+Protocol: one JSON object per line in both directions. Requests are
+{"id", "method", "params"}; replies are {"id", "result"} or
+{"id", "error": {"type", "message"}} and are sent as each request finishes,
+so one connection carries any number of calls at once.
+{"method": "cancel", "params": {"id": ...}} abandons a call in flight.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import signal
+from typing import Any, Dict, Optional
+
+from mcp.types import CallToolResult, Tool
+
+from app.core.config import settings
+from app.core.logging import logger, setup_logging
+
+DEFAULT_SOCKET = "./tempData/mcp_gateway.sock"
+# Longest line either side accepts; tool results can be large
+MAX_LINE = 64 * 1024 * 1024
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return (json.dumps(message, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+
+def _error_reply(error: Exception) -> Dict[str, str]:
+    if isinstance(error, TimeoutError):
+        kind = "timeout"
+    elif isinstance(error, ValueError):
+        kind = "value"
+    else:
+        kind = "error"
+    return {"type": kind, "message": str(error) or repr(error)}
+
+
+def _raise_error(error: Dict[str, str]) -> Exception:
+    kind = {"timeout": TimeoutError, "value": ValueError}.get(error.get("type"), RuntimeError)
+    return kind(error.get("message", "MCP gateway error"))
+
+
+class MCPGatewayClient:
+    """
+    A worker's connection to the gateway. All requests of the worker share one
+    connection and replies are matched to their callers by id. The connection
+    is opened again on the next call if the gateway restarts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self.read_task: Optional[asyncio.Task] = None
+        self.connect_lock = asyncio.Lock()
+        self.ids = itertools.count(1)
+        # request id -> future of its reply
+        self.pending: Dict[int, asyncio.Future] = {}
+        # Catalog as last listed by the gateway, identified by its build time there
+        self.catalog_version: Optional[float] = None
+        self.openai_tools: list = []
+        self.tools_map: Dict[str, Dict[str, Any]] = {}
+
+    async def _connect(self) -> asyncio.StreamWriter:
+        async with self.connect_lock:
+            if self.writer is None:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=MAX_LINE)
+                self.writer = writer
+                self.read_task = asyncio.create_task(self._read(reader, writer))
+                logger.info(f"Connected to MCP gateway at {self.path}")
+            return self.writer
+
+    async def _read(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        error = ConnectionError("MCP gateway closed the connection")
+        try:
+            while line := await reader.readline():
+                reply = json.loads(line)
+                future = self.pending.pop(reply.get("id"), None)
+                if future is None or future.done():
+                    continue  # The caller gave up meanwhile
+                if "error" in reply:
+                    future.set_exception(_raise_error(reply["error"]))
+                else:
+                    future.set_result(reply.get("result"))
+        except Exception as e:
+            error = ConnectionError(f"MCP gateway connection failed: {e!r}")
+        finally:
+            if self.writer is writer:
+                self.writer = None
+            writer.close()
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def request(self, method: str, params: Optional[Dict[str, Any]] = None) -> Any:
+        writer = self.writer or await self._connect()
+        request_id = next(self.ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            writer.write(_encode({"id": request_id, "method": method, "params": params or {}}))
+            await writer.drain()
+            return await future
+        except asyncio.CancelledError:
+            if request_id in self.pending and not writer.is_closing():
+                # Timed out or abandoned: let the gateway cancel the MCP call too
+                writer.write(_encode({"method": "cancel", "params": {"id": request_id}}))
+            raise
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def list_tools(self) -> list:
+        """The gateway's tool catalog; only transferred when it has changed."""
+        reply = await self.request("tools", {"version": self.catalog_version})
+        if "tools" in reply:
+            self.openai_tools = reply["tools"]
+            self.tools_map = {
+                tool["function"]["name"]: {
+                    "server": reply["servers"].get(tool["function"]["name"]),
+                    "tool": Tool(
+                        name=tool["function"]["name"],
+                        description=tool["function"].get("description"),
+                        inputSchema=tool["function"].get("parameters") or {},
+                    ),
+                }
+                for tool in self.openai_tools
+            }
+            self.catalog_version = reply["version"]
+        return self.openai_tools
+
+    async def call_tool(
+        self, tool_name: str, arguments: dict, timeout: Optional[float]
+    ) -> CallToolResult:
+        result = await self.request(
+            "call", {"tool": tool_name, "arguments": arguments, "timeout": timeout}
+        )
+        return CallToolResult.model_validate(result)
+
+    async def close(self):
+        if self.read_task is not None:
+            self.read_task.cancel()
+            await asyncio.gather(self.read_task, return_exceptions=True)
+
+
+class MCPGateway:
+    """Serves an MCPClientService to the gateway's connections."""
+
+    def __init__(self, service):
+        self.service = service
+        # connection handler task -> its writer
+        self.connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        connection = asyncio.current_task()
+        self.connections[connection] = writer
+        # request id -> task serving it, for cancel requests
+        calls: Dict[Any, asyncio.Task] = {}
+        try:
+            while line := await reader.readline():
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    logger.warning("Ignoring malformed MCP gateway request")
+                    continue
+                if message.get("method") == "cancel":
+                    task = calls.get((message.get("params") or {}).get("id"))
+                    if task is not None:
+                        task.cancel()
+                    continue
+                request_id = message.get("id")
+                task = asyncio.create_task(self._serve(message, writer))
+                calls[request_id] = task
+                task.add_done_callback(lambda _, request_id=request_id: calls.pop(request_id, None))
+        except Exception as e:
+            logger.warning(f"MCP gateway connection failed: {e!r}")
+        finally:
+            # The worker is gone, so nobody waits for these results any more
+            for task in calls.values():
+                task.cancel()
+            writer.close()
+            self.connections.pop(connection, None)
+
+    async def close(self):
+        """Ends all connections, failing the calls the workers still wait for."""
+        for writer in list(self.connections.values()):
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+
+    async def _serve(self, message: Dict[str, Any], writer: asyncio.StreamWriter):
+        reply: Dict[str, Any] = {"id": message.get("id")}
+        try:
+            reply["result"] = await self._dispatch(
+                message.get("method"), message.get("params") or {}
+            )
+        except Exception as e:
+            reply["error"] = _error_reply(e)
+        if writer.is_closing():
+            return
+        writer.write(_encode(reply))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass  # The worker disconnected; handle() cleans up
+
+    async def _dispatch(self, method: str, params: Dict[str, Any]) -> Any:
+        service = self.service
+        if method == "tools":
+            tools = await service.get_openai_tools()
+            version = service.catalog_built_at
+            if params.get("version") == version:
+                return {"version": version}
+            servers = {name: info["server"] for name, info in service.tools_map.items()}
+            return {"version": version, "tools": tools, "servers": servers}
+        if method == "call":
+            if params["tool"] not in service.tools_map:
+                await service.get_openai_tools()  # Listed by a worker before a restart
+            result = await service.execute_tool(
+                params["tool"], params.get("arguments") or {}, params.get("timeout")
+            )
+            return result.model_dump(mode="json", by_alias=True, exclude_none=True)
+        if method == "stats":
+            return await service.pool_stats()
+        raise ValueError(f"Unknown MCP gateway method '{method}'")
+
+
+async def _listening(path: str) -> bool:
+    try:
+        _, writer = await asyncio.open_unix_connection(path)
+    except OSError:
+        return False
+    writer.close()
+    return True
+
+
+async def serve(path: str):
+    # Imported here: mcp_manager imports this module for the client
+    from app.services.mcp_manager import MCPClientService
+
+    if await _listening(path):
+        raise SystemExit(f"An MCP gateway is already listening on {path}")
+    if os.path.exists(path):
+        os.unlink(path)  # Left behind by a gateway that did not shut down cleanly
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    service = MCPClientService()
+    await service.start(wait=settings.mcp_startup_wait)
+    gateway = MCPGateway(service)
+    server = await asyncio.start_unix_server(gateway.handle, path, limit=MAX_LINE)
+    os.chmod(path, 0o600)  # Only workers running as the same user may call tools
+    logger.info(f"MCP gateway listening on {path}")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    try:
+        await stop.wait()
+    finally:
+        server.close()
+        await gateway.close()
+        await service.cleanup()
+        if os.path.exists(path):
+            os.unlink(path)
+        logger.info("MCP gateway stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared MCP gateway for the API workers")
+    parser.add_argument(
+        "--socket",
+        default=settings.mcp_gateway_socket or DEFAULT_SOCKET,
+        help="Unix socket to listen on (default: mcp_gateway_socket from config.toml)",
+    )
+    args = parser.parse_args()
+    setup_logging()
+    asyncio.run(serve(args.socket))
+
+
+if __name__ == "__main__":
+    main()
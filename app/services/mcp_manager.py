@@ -1,133 +1,534 @@
+import asyncio
 import json
 import os
 import shutil
-from contextlib import AsyncExitStack
-from typing import Any, Dict, List
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
 
+import anyio
 from dotenv import load_dotenv
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.shared.message import SessionMessage
+from mcp.types import (
+    CONNECTION_CLOSED,
+    CancelledNotification,
+    CancelledNotificationParams,
+    ClientNotification,
+    JSONRPCRequest,
+    RequestId,
+    Tool,
+    ToolListChangedNotification,
+)
 from openai.types.chat.chat_completion_tool_union_param import (
     ChatCompletionToolUnionParam,
 )
 
+from app.core.cache import TTLCache
 from app.core.config import settings
 from app.core.logging import logger
+from app.core.metrics import TOOL_SECONDS, timed
+from app.core.singleflight import SingleFlight
+from app.services.mcp_gateway import MCPGatewayClient
+from app.services.mcp_pool import PooledSession, SessionPool
 
 # Load environment variables from .env file
 load_dotenv()
 
+# Tool lists remembered across restarts so lazy servers need not start to be listed
+TOOL_SNAPSHOT_PATH = "./tempData/mcp_tools.json"
+# Errors meaning a session's subprocess or pipe is gone
+CLOSED_ERRORS = (anyio.ClosedResourceError, anyio.BrokenResourceError)
+# Sessions above a pool's minimum are shut down after this many idle seconds
+POOL_IDLE_TIMEOUT = 300
+# Delay before restarting a crashed server, doubled per failed attempt up to the max
+RESTART_BACKOFF = 1
+RESTART_BACKOFF_MAX = 60
+# Extra seconds a worker waits for the gateway beyond a tool call's own limit
+GATEWAY_TIMEOUT_MARGIN = 2
+# Longest a worker waits for the gateway's pool statistics
+GATEWAY_STATS_TIMEOUT = 10
+
+# Ids of the requests sent by the current task, while _call_tool collects them
+_sent_request_ids: ContextVar[Optional[List[RequestId]]] = ContextVar(
+    "sent_request_ids", default=None
+)
+
+
+class _RequestIdRecorder:
+    """
+    Wraps a session's write stream and notes the JSON-RPC id of each request
+    as it goes out, so a timed-out tool call is cancelled by its real id.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    async def send(self, message: SessionMessage):
+        sent = _sent_request_ids.get()
+        if sent is not None and isinstance(message.message.root, JSONRPCRequest):
+            sent.append(message.message.root.id)
+        await self.stream.send(message)
+
+    async def __aenter__(self):
+        await self.stream.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return await self.stream.__aexit__(*exc_info)
+
+    def __getattr__(self, name: str):
+        return getattr(self.stream, name)
+
 
 class MCPClientService:
-    def __init__(self):
+    def __init__(self, gateway_socket: str = ""):
+        # Set in gateway mode: tools are listed and called through the shared
+        # gateway process instead of servers of our own
+        self.gateway = MCPGatewayClient(gateway_socket) if gateway_socket else None
+        # server_name -> a live session, used for listing tools
         self.sessions: Dict[str, ClientSession] = {}
-        self.exit_stack = AsyncExitStack()
+        self.server_configs: Dict[str, Dict[str, Any]] = {}
+        # server_name -> task owning the server's first stdio subprocess and session
+        self.server_tasks: Dict[str, asyncio.Task] = {}
+        # server_name -> future resolved with the session (or None on failure)
+        self.server_ready: Dict[str, asyncio.Future] = {}
+        self.stop_event = asyncio.Event()
+        self.startup_task: Optional[asyncio.Task] = None
         self.tools_map: Dict[
             str, Dict[str, Any]
         ] = {}  # tool_name -> {server_name, tool_obj}
-
-    async def load_config_and_connect(self):
-        """
-        Reads mcp_config.json and connects to all defined servers.
-        """
+        # server_name -> sessions that tool calls are spread over
+        self.pools: Dict[str, SessionPool] = {}
+        # Precomputed tool catalog, rebuilt only when invalidated or expired
+        self.openai_tools: Optional[list[ChatCompletionToolUnionParam]] = None
+        self.catalog_built_at = 0.0
+        self.catalog_version = 0  # Bumped on every invalidation
+        self.catalog_lock = asyncio.Lock()
+        # server_name -> tools remembered from the last listing, used for lazy servers
+        self.tool_snapshot: Dict[str, List[Dict[str, Any]]] = {}
+        # (server, tool, canonical args) -> result, for servers with a "cache" entry
+        self.result_cache = TTLCache(
+            maxsize=settings.mcp_result_cache_size, ttl=settings.mcp_result_cache_ttl
+        )
+        # Identical cacheable tool calls in flight at the same time share one call
+        self.tool_flights = SingleFlight()
+        # server_name -> consecutive restarts since the server crashed, for backoff
+        self.restarts: Dict[str, int] = {}
+        # Fire-and-forget cancel notifications, referenced until they finish
+        self.background_tasks: set[asyncio.Task] = set()
+
+    @staticmethod
+    def _read_server_configs() -> Optional[Dict[str, Dict[str, Any]]]:
         config_path = settings.mcp_config_path
         if not os.path.exists(config_path):
             logger.warning(
                 f"MCP config not found at {config_path}, skipping MCP connection."
             )
-            return
+            return None
 
         with open(config_path, "r", encoding="utf-8") as f:
-            config = json.load(f)
+            return json.load(f).get("mcpServers", {})
 
-        servers = config.get("mcpServers", {})
+    def load_config(self):
+        """
+        Reads mcp_config.json and the remembered tool lists of lazy servers.
+        """
+        server_configs = self._read_server_configs()
+        if server_configs is None:
+            return
+        self.server_configs = server_configs
+
+        for name, srv_conf in self.server_configs.items():
+            if name in self.pools:
+                continue
+            min_sessions = int(srv_conf.get("minSessions", 1))
+            max_concurrency = srv_conf.get("maxConcurrency")
+            self.pools[name] = SessionPool(
+                name,
+                spawn=lambda name=name: self._spawn_session(name),
+                min_size=min_sessions,
+                max_size=int(srv_conf.get("maxSessions", min_sessions)),
+                per_session=int(max_concurrency) if max_concurrency else None,
+            )
 
-        for name, srv_conf in servers.items():
-            if name in self.sessions:
-                continue  # Already connected
+        if os.path.exists(TOOL_SNAPSHOT_PATH):
+            try:
+                with open(TOOL_SNAPSHOT_PATH, "r", encoding="utf-8") as f:
+                    self.tool_snapshot = json.load(f)
+            except Exception as e:
+                logger.warning(f"Ignoring unreadable MCP tool snapshot: {e}")
 
-            command = srv_conf.get("command")
-            args = srv_conf.get("args", [])
-            env = srv_conf.get("env", {})
+    async def start(self, wait: float):
+        """
+        Connects to the servers in the background and waits at most `wait` seconds,
+        so the app can start serving while slow servers are still coming up.
+        In gateway mode this only fetches the gateway's tool catalog.
+        """
+        if self.gateway is not None:
+            # Only for the tool timeouts; the gateway runs the servers
+            self.server_configs = self._read_server_configs() or {}
+            try:
+                await asyncio.wait_for(self.get_openai_tools(), wait)
+            except (OSError, asyncio.TimeoutError) as e:
+                logger.warning(
+                    f"MCP gateway at {self.gateway.path} not ready ({e!r}), retrying on first use."
+                )
+            return
 
-            # Resolve command path (important for Windows)
-            # shutil.which finds the full path of the executable
-            resolved_command = shutil.which(command)
-            if not resolved_command:
-                # Fallback specific for npx on Windows if shutil.which didn't find it directly
-                if command == "npx" and os.name == "nt":
-                    resolved_command = shutil.which("npx.cmd")
+        self.startup_task = asyncio.create_task(self.load_config_and_connect())
+        done, _ = await asyncio.wait({self.startup_task}, timeout=wait)
+        if not done:
+            pending = [n for n in self.server_ready if n not in self.sessions]
+            logger.info(f"Still connecting to MCP Servers in background: {pending}")
 
-                if not resolved_command:
-                    logger.warning(
-                        f"Warning: Command '{command}' not found in PATH for server '{name}'."
-                    )
-                    # We continue anyway, hoping the system can resolve it or it's an absolute path
-                    resolved_command = command
-
-            # Process environment variables: replace placeholders like ${VAR}
-            processed_env = {}
-            for k, v in env.items():
-                if isinstance(v, str):
-                    # expandvars replaces ${VAR} or $VAR with the value from os.environ
-                    processed_env[k] = os.path.expandvars(v)
-                else:
-                    processed_env[k] = v
+    async def load_config_and_connect(self):
+        """
+        Reads mcp_config.json and connects to all non-lazy servers concurrently.
+        """
+        self.load_config()
+
+        eager = [
+            name for name, srv_conf in self.server_configs.items()
+            if not srv_conf.get("lazy")
+        ]
+        await asyncio.gather(*(self.connect_server(name) for name in eager))
 
-            # Merge with current env
-            full_env = os.environ.copy()
-            full_env.update(processed_env)
+        # Build the tool catalog once, up front, instead of on the first request
+        async with self.catalog_lock:
+            await self._refresh_catalog()
 
-            server_params = StdioServerParameters(
-                command=resolved_command, args=args, env=full_env
+    async def connect_server(self, name: str) -> Optional[ClientSession]:
+        """
+        Starts a server (or joins a start already in progress) and waits for its
+        session, bounded by the server's "connectTimeout".
+        """
+        if name in self.sessions:
+            return self.sessions[name]
+
+        srv_conf = self.server_configs.get(name)
+        if srv_conf is None:
+            return None
+
+        ready = self.server_ready.get(name)
+        if ready is None or ready.done():
+            ready = asyncio.get_running_loop().create_future()
+            self.server_ready[name] = ready
+            self.server_tasks[name] = self._spawn_session(name, ready)
+
+        timeout = srv_conf.get("connectTimeout", settings.mcp_connect_timeout)
+        try:
+            return await asyncio.wait_for(
+                asyncio.shield(self.server_ready[name]), timeout
             )
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out after {timeout}s connecting to MCP Server {name}")
+            self.server_tasks[name].cancel()
+            return None
+
+    def _server_params(self, name: str, srv_conf: Dict[str, Any]) -> StdioServerParameters:
+        command = srv_conf.get("command")
+        args = srv_conf.get("args", [])
+        env = srv_conf.get("env", {})
+
+        # Resolve command path (important for Windows)
+        # shutil.which finds the full path of the executable
+        resolved_command = shutil.which(command)
+        if not resolved_command:
+            # Fallback specific for npx on Windows if shutil.which didn't find it directly
+            if command == "npx" and os.name == "nt":
+                resolved_command = shutil.which("npx.cmd")
 
-            try:
-                # Enter the stdio_client context
-                transport = await self.exit_stack.enter_async_context(
-                    stdio_client(server_params)
+            if not resolved_command:
+                logger.warning(
+                    f"Warning: Command '{command}' not found in PATH for server '{name}'."
                 )
-                read, write = transport
-
-                # Create and enter the session context
-                session = await self.exit_stack.enter_async_context(
-                    ClientSession(read, write)
+                # We continue anyway, hoping the system can resolve it or it's an absolute path
+                resolved_command = command
+
+        # Process environment variables: replace placeholders like ${VAR}
+        processed_env = {}
+        for k, v in env.items():
+            if isinstance(v, str):
+                # expandvars replaces ${VAR} or $VAR with the value from os.environ
+                processed_env[k] = os.path.expandvars(v)
+            else:
+                processed_env[k] = v
+
+        # Merge with current env
+        full_env = os.environ.copy()
+        full_env.update(processed_env)
+
+        return StdioServerParameters(command=resolved_command, args=args, env=full_env)
+
+    def _spawn_session(
+        self, name: str, ready: Optional[asyncio.Future] = None
+    ) -> asyncio.Task:
+        """Starts one more session of a server in its pool."""
+        pool = self.pools[name]
+        member = PooledSession()
+        pool.members.append(member)
+        member.task = asyncio.create_task(self._run_server(name, pool, member, ready))
+        return member.task
+
+    async def _run_server(
+        self,
+        name: str,
+        pool: SessionPool,
+        member: PooledSession,
+        ready: Optional[asyncio.Future] = None,
+    ):
+        """
+        Owns one session's transport and subprocess for their whole lifetime.
+        The contexts must be entered and exited in the same task, so each
+        session gets its own task instead of sharing an AsyncExitStack.
+        """
+        session = None
+        idle = False
+        try:
+            server_params = self._server_params(name, self.server_configs[name])
+            async with stdio_client(server_params) as (read, write):
+                async with ClientSession(
+                    read, _RequestIdRecorder(write), message_handler=self._notification_handler(name)
+                ) as session:
+                    # Initialize
+                    await session.initialize()
+
+                    member.session = session
+                    self.restarts.pop(name, None)
+                    if name not in self.sessions:
+                        self.sessions[name] = session
+                        self.invalidate_tools(f"connected to {name}")
+                        logger.info(f"Successfully connected to MCP Server: {name}")
+                    else:
+                        logger.info(
+                            f"MCP Server {name} pool grew to {len(pool.live())} sessions"
+                        )
+                    if ready is not None:
+                        ready.set_result(session)
+                    pool.notify()
+                    # The first session gates readiness; the rest warm up behind it
+                    for _ in range(pool.min_size - len(pool.members)):
+                        self._spawn_session(name)
+
+                    idle = await self._serve_until_retired(pool, member)
+                    member.session = None  # No new calls while shutting down
+        except Exception as e:
+            if session is not None:
+                logger.error(f"MCP Server {name} disconnected: {e}")
+            else:
+                logger.error(f"Failed to connect to MCP Server {name}: {e}")
+        finally:
+            member.session = None
+            pool.members.remove(member)
+            pool.notify()
+            if ready is not None and not ready.done():
+                ready.set_result(None)
+            if session is not None and self.sessions.get(name) is session:
+                live = pool.live()
+                if live:
+                    self.sessions[name] = live[0].session  # type: ignore
+                else:
+                    del self.sessions[name]
+                self.invalidate_tools(f"disconnected from {name}")
+            # Replace a session that died (or a restart that failed); with no
+            # session left the whole server is restarted after a backoff
+            crashed = session is not None and not idle
+            if (
+                (crashed or name in self.restarts)
+                and not self.stop_event.is_set()
+                and len(pool.members) < pool.min_size
+            ):
+                if pool.live():
+                    self._spawn_session(name)
+                else:
+                    self._schedule_restart(name)
+
+    def _schedule_restart(self, name: str):
+        attempt = self.restarts.get(name, 0)
+        self.restarts[name] = attempt + 1
+        delay = min(RESTART_BACKOFF * 2**attempt, RESTART_BACKOFF_MAX)
+        logger.info(f"Restarting MCP Server {name} in {delay}s")
+        task = asyncio.create_task(self._restart_later(name, delay))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def _restart_later(self, name: str, delay: float):
+        try:
+            await asyncio.wait_for(self.stop_event.wait(), delay)
+            return  # Shutting down
+        except asyncio.TimeoutError:
+            pass
+        # A tool call may have restarted it in the meantime
+        if not self.pools[name].members:
+            await self.connect_server(name)
+
+    async def _serve_until_retired(
+        self, pool: SessionPool, member: PooledSession
+    ) -> bool:
+        """
+        Waits until the session is retired (shutdown or connection lost).
+        Returns True if it was shut down for idling above the pool's minimum.
+        """
+        while True:
+            try:
+                await asyncio.wait_for(member.retired.wait(), POOL_IDLE_TIMEOUT)
+                return False
+            except asyncio.TimeoutError:
+                if (
+                    member.in_flight == 0
+                    and time.monotonic() - member.last_used > POOL_IDLE_TIMEOUT
+                    and len(pool.live()) > pool.min_size
+                ):
+                    logger.info(f"Closing idle session of MCP Server {pool.name}")
+                    return True
+
+    def _notification_handler(self, server_name: str):
+        """Creates a session message handler that watches for tools/list_changed."""
+
+        async def handle(message):
+            notification = getattr(message, "root", None)
+            if isinstance(notification, ToolListChangedNotification):
+                self.invalidate_tools(f"tools/list_changed from {server_name}")
+
+        return handle
+
+    def invalidate_tools(self, reason: str):
+        """Drops the cached tool catalog so the next lookup lists the servers again."""
+        if self.openai_tools is not None:
+            logger.info(f"Invalidating MCP tool catalog: {reason}")
+        self.openai_tools = None
+        self.catalog_version += 1
+
+    def _catalog_expired(self) -> bool:
+        if self.openai_tools is None:
+            return True
+        ttl = settings.mcp_tools_ttl
+        return bool(ttl) and time.monotonic() - self.catalog_built_at > ttl
+
+    async def _refresh_catalog(self) -> list[ChatCompletionToolUnionParam]:
+        """
+        Lists tools on all servers in parallel and precomputes the OpenAI tool list.
+        Lazy servers that are not running yet, and crashed servers waiting for
+        a restart, contribute their remembered tools.
+        Handles duplicate tool names by appending server name.
+        """
+        server_names = list(self.server_configs) or list(self.sessions)
+        version = self.catalog_version
+
+        # A lazy server that was never listed has to start once to learn its tools
+        await asyncio.gather(
+            *(
+                self.connect_server(name)
+                for name in server_names
+                if name not in self.sessions and name not in self.tool_snapshot
+                and self.server_configs.get(name, {}).get("lazy")
+            )
+        )
+
+        listed = [name for name in server_names if name in self.sessions]
+        results = await asyncio.gather(
+            *(self.sessions[name].list_tools() for name in listed),
+            return_exceptions=True,
+        )
+
+        server_tools: Dict[str, List[Tool]] = {}
+        for server_name, result in zip(listed, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Error listing tools for {server_name}: {result!r}")
+                self._retire_if_closed(server_name, result)
+                continue
+            server_tools[server_name] = result.tools
+
+        # Crashed servers keep their tools too, so a call can restart them
+        for server_name in server_names:
+            if server_name not in server_tools and (
+                self.server_configs.get(server_name, {}).get("lazy")
+                or server_name in self.restarts
+            ):
+                server_tools[server_name] = [
+                    Tool.model_validate(t) for t in self.tool_snapshot.get(server_name, [])
+                ]
+
+        self._save_tool_snapshot(server_tools)
+
+        tools_map: Dict[str, Dict[str, Any]] = {}
+        openai_tools: list[ChatCompletionToolUnionParam] = []
+
+        # Walk servers in config order so conflict renaming stays stable
+        for server_name in server_names:
+            for tool in server_tools.get(server_name, []):
+                tool_name = tool.name
+
+                # Handle naming conflicts
+                final_name = tool_name
+                if final_name in tools_map:
+                    # Conflict: rename to toolName__serverName
+                    final_name = f"{tool_name}__{server_name}"
+                    # Edge case: still conflict? (Unlikely)
+                    if final_name in tools_map:
+                        final_name = f"{tool_name}__{server_name}_{os.urandom(2).hex()}"
+
+                tools_map[final_name] = {
+                    "server": server_name,
+                    "tool": tool,
+                    "original_name": tool_name,  # Store original name for execution
+                }
+
+                openai_tools.append(
+                    {
+                        "type": "function",
+                        "function": {
+                            "name": final_name,
+                            "description": f"[{server_name}] {tool.description}" if tool.description else f"Tool from {server_name}",
+                            "parameters": tool.inputSchema,
+                        },
+                    }
                 )
 
-                # Initialize
-                await session.initialize()
+        # Swap in atomically so in-flight execute_tool lookups never see a half-built map
+        self.tools_map = tools_map
+        if version == self.catalog_version:
+            # Only cache if no server came or went while we were listing
+            self.openai_tools = openai_tools
+            self.catalog_built_at = time.monotonic()
+        logger.info(
+            f"MCP tool catalog built: {len(openai_tools)} tools from {len(server_tools)} servers"
+        )
+        return openai_tools
 
-                self.sessions[name] = session
-                logger.info(f"Successfully connected to MCP Server: {name}")
+    def _save_tool_snapshot(self, server_tools: Dict[str, List[Tool]]):
+        """Remembers each server's tools so lazy servers can be offered without starting them."""
+        snapshot = dict(self.tool_snapshot)
+        for server_name, tools in server_tools.items():
+            snapshot[server_name] = [t.model_dump(mode="json") for t in tools]
+        if snapshot == self.tool_snapshot:
+            return
 
-            except Exception as e:
-                logger.error(f"Failed to connect to MCP Server {name}: {e}")
+        self.tool_snapshot = snapshot
+        try:
+            with open(TOOL_SNAPSHOT_PATH, "w", encoding="utf-8") as f:
+                json.dump(snapshot, f)
+        except Exception as e:
+            logger.warning(f"Could not save MCP tool snapshot: {e}")
 
     async def get_available_tools(self) -> str:
         """
         Lists all tools from all connected servers and returns a formatted string description.
-        Also caches the mapping of tool_name -> server for execution.
         """
-        if not self.sessions:
-            await self.load_config_and_connect()
+        await self.get_openai_tools()
 
-        self.tools_map.clear()
         descriptions = []
+        for tool_name, tool_info in self.tools_map.items():
+            tool = tool_info["tool"]
 
-        for server_name, session in self.sessions.items():
-            try:
-                result = await session.list_tools()
-                for tool in result.tools:
-                    self.tools_map[tool.name] = {"server": server_name, "tool": tool}
-
-                    # Format description for LLM
-                    desc = f"- {tool.name}: {tool.description}"
-                    if tool.inputSchema:
-                        desc += f"\n  Schema: {json.dumps(tool.inputSchema)}"
-                    descriptions.append(desc)
-
-            except Exception as e:
-                logger.error(f"Error listing tools for {server_name}: {e}")
+            # Format description for LLM
+            desc = f"- {tool_name}: {tool.description}"
+            if tool.inputSchema:
+                desc += f"\n  Schema: {json.dumps(tool.inputSchema)}"
+            descriptions.append(desc)
 
         if not descriptions:
             return "No tools available."
@@ -136,55 +537,52 @@ class MCPClientService:
 
     async def get_openai_tools(self) -> list[ChatCompletionToolUnionParam]:
         """
-        Returns tools in OpenAI function calling format.
-        Handles duplicate tool names by appending server name.
+        Returns tools in OpenAI function calling format from the cached catalog.
+        The catalog is rebuilt on tools/list_changed, on (re)connect or after mcp_tools_ttl.
         """
-        if not self.sessions:
-            await self.load_config_and_connect()
-
-        self.tools_map.clear()
-        openai_tools = []
+        if self.gateway is not None:
+            tools = await self.gateway.list_tools()
+            self.tools_map = self.gateway.tools_map
+            return tools
 
-        for server_name, session in self.sessions.items():
-            try:
-                result = await session.list_tools()
-                for tool in result.tools:
-                    tool_name = tool.name
-                    
-                    # Handle naming conflicts
-                    final_name = tool_name
-                    if final_name in self.tools_map:
-                        # Conflict: rename to toolName__serverName
-                        final_name = f"{tool_name}__{server_name}"
-                        # Edge case: still conflict? (Unlikely)
-                        if final_name in self.tools_map:
-                             final_name = f"{tool_name}__{server_name}_{os.urandom(2).hex()}"
-
-                    self.tools_map[final_name] = {
-                        "server": server_name, 
-                        "tool": tool,
-                        "original_name": tool_name # Store original name for execution
-                    }
+        if not self.server_configs and not self.sessions:
+            await self.load_config_and_connect()
 
-                    openai_tools.append(
-                        {
-                            "type": "function",
-                            "function": {
-                                "name": final_name,
-                                "description": f"[{server_name}] {tool.description}" if tool.description else f"Tool from {server_name}",
-                                "parameters": tool.inputSchema,
-                            },
-                        }
-                    )
-            except Exception as e:
-                logger.error(f"Error listing tools for {server_name}: {e}")
+        tools = self.openai_tools
+        if self._catalog_expired():
+            async with self.catalog_lock:
+                # Another request may have rebuilt it while we waited
+                tools = self.openai_tools
+                if self._catalog_expired():
+                    tools = await self._refresh_catalog()
 
-        return openai_tools
+        return tools or []
 
-    async def execute_tool(self, tool_name: str, arguments: dict) -> Any:
+    def _cache_ttl(self, server_name: str, tool_name: str) -> float:
+        """
+        Seconds a tool's results may be reused, from the server's "cache" entry:
+        {"ttl": 300, "tools": {"some_tool": 0}}. No entry means never cached.
+        """
+        cache_conf = self.server_configs.get(server_name, {}).get("cache")
+        if not cache_conf:
+            return 0
+        tools = cache_conf.get("tools", {})
+        if tool_name in tools:
+            return float(tools[tool_name] or 0)
+        return float(cache_conf.get("ttl", settings.mcp_result_cache_ttl))
+
+    async def execute_tool(
+        self, tool_name: str, arguments: dict, timeout: Optional[float] = None
+    ) -> Any:
         """
         Executes a specific tool on the appropriate server.
+        Results of cacheable tools are reused for identical arguments until their TTL.
+        The call (including starting the server and queueing for a session) is
+        bounded by the server's "toolTimeout" and by `timeout`, if given.
         """
+        if self.gateway is not None:
+            return await self._execute_on_gateway(tool_name, arguments, timeout)
+
         if tool_name not in self.tools_map:
             raise ValueError(f"Tool '{tool_name}' not found.")
 
@@ -192,19 +590,188 @@ class MCPClientService:
         server_name = tool_info["server"]
         # Use the original tool name for the actual MCP call
         original_name = tool_info.get("original_name", tool_name)
-        
-        session = self.sessions.get(server_name)
+
+        with timed(
+            TOOL_SECONDS, "mcp.tool", server=server_name, tool=original_name, status="ok"
+        ) as stage:
+            return await self._execute(
+                tool_name, tool_info, server_name, original_name, arguments, timeout, stage
+            )
+
+    async def _execute_on_gateway(
+        self, tool_name: str, arguments: dict, timeout: Optional[float]
+    ) -> Any:
+        server_name = self.tools_map.get(tool_name, {}).get("server", "")
+        with timed(
+            TOOL_SECONDS, "mcp.tool", server=server_name, tool=tool_name, status="ok"
+        ) as stage:
+            limit = self._tool_limit(server_name, timeout)
+            try:
+                # The gateway enforces the limit itself; this covers a gateway that
+                # stalls, and cancelling the request cancels the call there too
+                result = await asyncio.wait_for(
+                    self.gateway.call_tool(tool_name, arguments, timeout),
+                    limit + GATEWAY_TIMEOUT_MARGIN,
+                )
+            except (TimeoutError, asyncio.TimeoutError) as e:
+                stage["status"] = "timeout"
+                if str(e):
+                    raise  # Reported by the gateway
+                raise TimeoutError(
+                    f"MCP gateway did not answer tool '{tool_name}' within {limit:.1f}s"
+                ) from None
+            if result.isError:
+                stage["status"] = "error"
+            return result
+
+    def _tool_limit(self, server_name: str, timeout: Optional[float]) -> float:
+        limit = self.server_configs.get(server_name, {}).get(
+            "toolTimeout", settings.mcp_tool_timeout
+        )
+        return limit if timeout is None else min(limit, timeout)
+
+    async def _execute(
+        self,
+        tool_name: str,
+        tool_info: Dict[str, Any],
+        server_name: str,
+        original_name: str,
+        arguments: dict,
+        timeout: Optional[float],
+        stage: Dict[str, Any],
+    ) -> Any:
+        ttl = self._cache_ttl(server_name, original_name)
+        annotations = getattr(tool_info["tool"], "annotations", None)
+        if annotations is not None and annotations.readOnlyHint is False:
+            ttl = 0  # The server declares that this tool changes state
+        cache_key = None
+        if ttl > 0:
+            canonical = json.dumps(
+                arguments, sort_keys=True, separators=(",", ":"), ensure_ascii=False
+            )
+            cache_key = (server_name, original_name, canonical)
+            cached = self.result_cache.get(cache_key)
+            if cached is not None:
+                logger.info(f"Tool cache hit for '{original_name}' on '{server_name}'.")
+                stage["status"] = "cached"
+                return cached
+
+        limit = self._tool_limit(server_name, timeout)
+
+        def dispatch():
+            return self._dispatch(server_name, tool_name, original_name, arguments)
+
+        if cache_key is None:
+            call = dispatch()
+        else:
+            # Cacheable means idempotent, so identical calls in flight share one
+            call = self.tool_flights.do(cache_key, dispatch)
+        try:
+            result = await asyncio.wait_for(call, limit)
+        except asyncio.TimeoutError:
+            stage["status"] = "timeout"
+            raise TimeoutError(f"Tool '{tool_name}' timed out after {limit:.1f}s") from None
+
+        if getattr(result, "isError", False):
+            stage["status"] = "error"
+        # Errors are often transient (rate limits, timeouts), so never keep them
+        if cache_key is not None and not getattr(result, "isError", False):
+            self.result_cache.set(cache_key, result, ttl=ttl)
+        return result
+
+    async def _dispatch(
+        self, server_name: str, tool_name: str, original_name: str, arguments: dict
+    ) -> Any:
+        # Lazy servers start on first use; crashed ones are restarted here as well
+        session = self.sessions.get(server_name) or await self.connect_server(
+            server_name
+        )
 
         if not session:
             raise ValueError(f"Session for server '{server_name}' is not active.")
 
-        logger.info(f"Executing tool '{original_name}' (alias: {tool_name}) on server '{server_name}'.")
-        result = await session.call_tool(original_name, arguments)
-        return result
+        # Spread over the server's sessions; "maxConcurrency" caps each session
+        async with self.pools[server_name].acquire() as member:
+            logger.info(f"Executing tool '{original_name}' (alias: {tool_name}) on server '{server_name}'.")
+            return await self._call_tool(member, original_name, arguments)
+
+    async def _call_tool(
+        self, member: PooledSession, tool_name: str, arguments: dict
+    ) -> Any:
+        session: ClientSession = member.session  # type: ignore
+        sent: List[RequestId] = []
+        token = _sent_request_ids.set(sent)
+        try:
+            return await session.call_tool(tool_name, arguments)
+        except asyncio.CancelledError:
+            # Timed out or abandoned: tell the server to stop working on it,
+            # unless the request never went out
+            if sent:
+                task = asyncio.create_task(self._send_cancel(session, sent[0]))
+                self.background_tasks.add(task)
+                task.add_done_callback(self.background_tasks.discard)
+            raise
+        except Exception as e:
+            if self._is_closed(e):
+                member.retired.set()  # Dead subprocess: let the pool replace it
+            raise
+        finally:
+            _sent_request_ids.reset(token)
+
+    @staticmethod
+    async def _send_cancel(session: ClientSession, request_id: RequestId):
+        try:
+            await session.send_notification(
+                ClientNotification(
+                    CancelledNotification(
+                        params=CancelledNotificationParams(
+                            requestId=request_id, reason="Request timed out"
+                        )
+                    )
+                )
+            )
+        except Exception as e:
+            logger.warning(f"Could not cancel MCP request {request_id}: {e}")
+
+    @staticmethod
+    def _is_closed(error: BaseException) -> bool:
+        if isinstance(error, McpError):
+            return error.error.code == CONNECTION_CLOSED
+        return isinstance(error, CLOSED_ERRORS)
+
+    def _retire_if_closed(self, server_name: str, error: BaseException):
+        """Retires the listing session if its subprocess is gone, so it gets replaced."""
+        if self._is_closed(error):
+            for member in self.pools[server_name].live():
+                if member.session is self.sessions.get(server_name):
+                    member.retired.set()
+
+    async def pool_stats(self) -> Dict[str, Any]:
+        if self.gateway is not None:
+            return await asyncio.wait_for(
+                self.gateway.request("stats"), GATEWAY_STATS_TIMEOUT
+            )
+        return {name: pool.stats() for name, pool in self.pools.items()}
 
     async def cleanup(self):
-        await self.exit_stack.aclose()
+        if self.gateway is not None:
+            await self.gateway.close()
+            return
+        if self.startup_task and not self.startup_task.done():
+            self.startup_task.cancel()
+        self.stop_event.set()
+        tasks = []
+        for pool in self.pools.values():
+            for member in list(pool.members):
+                member.retired.set()
+                if member.session is None and member.task:
+                    member.task.cancel()  # Still starting up, nothing to shut down cleanly
+                if member.task:
+                    tasks.append(member.task)
+        # Pending restarts return once stop_event is set
+        tasks.extend(self.background_tasks)
+        await asyncio.gather(*tasks, return_exceptions=True)
 
 
 # Singleton instance
-mcp_service = MCPClientService()
+mcp_service = MCPClientService(settings.mcp_gateway_socket)
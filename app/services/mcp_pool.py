@@ -0,0 +1,110 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from mcp import ClientSession
+
+
+class PooledSession:
+    """One session of a pooled server, with its own subprocess and owner task."""
+
+    def __init__(self):
+        self.session: Optional[ClientSession] = None
+        self.task: Optional[asyncio.Task] = None
+        self.retired = asyncio.Event()  # Set to shut this session down
+        self.in_flight = 0
+        self.calls = 0
+        self.last_used = time.monotonic()
+
+
+class SessionPool:
+    """
+    The sessions of one MCP server ("minSessions" to "maxSessions").
+    Calls go to the least-loaded live session, each session runs at most
+    `per_session` calls at once, and the pool grows through `spawn` while
+    callers find every session busy.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        spawn: Callable[[], Any],
+        min_size: int = 1,
+        max_size: int = 1,
+        per_session: Optional[int] = None,
+    ):
+        self.name = name
+        self.spawn = spawn
+        self.min_size = max(1, min_size)
+        self.max_size = max(self.min_size, max_size)
+        self.per_session = per_session
+        self.members: List[PooledSession] = []
+        self._changed = asyncio.Event()
+        # Queue-wait statistics
+        self.calls = 0
+        self.queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def live(self) -> List[PooledSession]:
+        return [m for m in self.members if m.session is not None]
+
+    def notify(self):
+        """Wakes callers waiting for a free session."""
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _pick(self) -> Optional[PooledSession]:
+        free = [
+            m for m in self.live()
+            if self.per_session is None or m.in_flight < self.per_session
+        ]
+        return min(free, key=lambda m: m.in_flight, default=None)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[PooledSession]:
+        """Reserves a slot on the least-loaded session for one call."""
+        start = time.monotonic()
+        while True:
+            member = self._pick()
+            if (member is None or member.in_flight > 0) and len(
+                self.members
+            ) < self.max_size:
+                self.spawn()  # Every session is busy: add one for the next caller
+            if member is not None:
+                break
+            if not self.members:
+                raise RuntimeError(f"No live session for MCP Server {self.name}")
+            await self._changed.wait()
+
+        member.in_flight += 1
+        waited = time.monotonic() - start
+        self.calls += 1
+        if waited > 0.001:
+            self.queued += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        try:
+            yield member
+        finally:
+            member.in_flight -= 1
+            member.calls += 1
+            member.last_used = time.monotonic()
+            self.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        live = self.live()
+        return {
+            "sessions": len(live),
+            "starting": len(self.members) - len(live),
+            "min_sessions": self.min_size,
+            "max_sessions": self.max_size,
+            "in_flight": sum(m.in_flight for m in live),
+            "calls": self.calls,
+            "queued_calls": self.queued,
+            "avg_wait_ms": round(self.wait_total / self.calls * 1000, 2)
+            if self.calls
+            else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 2),
+        }
@@ -0,0 +1,63 @@
+import json
+import zlib
+from typing import Any, Dict, Optional, Union
+
+from pydantic_core import to_json
+
+from app.models.ui_protocol import UIResponse, ui_response_adapter
+
+# Message.content_type values
+CONTENT_TEXT = "text"  # Plain text in Message.content
+CONTENT_UI = "ui"  # UIResponse in Message.payload
+CONTENT_JSON = "json"  # Any other JSON object in Message.payload
+
+StoredContent = Union[UIResponse, Dict[str, Any], str]
+
+
+def _pack(text: str) -> bytes:
+    return zlib.compress(text.encode())
+
+
+def encode_content(content: StoredContent) -> Dict[str, Any]:
+    """
+    Message fields for decoded content. Structured payloads are stored as
+    zlib-compressed JSON, tagged with their type so reads never guess.
+    """
+    if isinstance(content, UIResponse):
+        return {
+            "content_type": CONTENT_UI,
+            "content": "",
+            "payload": _pack(content.model_dump_json()),
+        }
+    if isinstance(content, dict):
+        text = json.dumps(content, ensure_ascii=False, separators=(",", ":"))
+        return {"content_type": CONTENT_JSON, "content": "", "payload": _pack(text)}
+    return {"content_type": CONTENT_TEXT, "content": content, "payload": None}
+
+
+def decode_message(message: Any) -> StoredContent:
+    """Decodes a Message row by its content_type, without trial parsing."""
+    if message.content_type == CONTENT_UI:
+        return ui_response_adapter.validate_json(zlib.decompress(message.payload))
+    if message.content_type == CONTENT_JSON:
+        return json.loads(zlib.decompress(message.payload))
+    return message.content
+
+
+def message_json(message: Any) -> bytes:
+    """
+    The message content as JSON for API responses. Structured payloads are
+    stored as the JSON of an already validated value, so they are returned
+    as is instead of being decoded and serialized again.
+    """
+    if message.content_type == CONTENT_TEXT or message.payload is None:
+        return to_json(message.content)
+    return zlib.decompress(message.payload)
+
+
+def message_text(message: Any) -> str:
+    """The message as text, e.g. for the LLM context; structured payloads as JSON."""
+    payload: Optional[bytes] = message.payload
+    if message.content_type == CONTENT_TEXT or payload is None:
+        return message.content
+    return zlib.decompress(payload).decode()
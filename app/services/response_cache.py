@@ -0,0 +1,111 @@
+import datetime
+import hashlib
+import json
+import re
+import unicodedata
+from typing import Any, Dict, Optional
+
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.core.database import AnalyzeCacheEntry, db_task
+from app.models.ui_protocol import UIResponse
+
+# Purge expired SQLite rows once every this many writes
+PURGE_EVERY = 100
+
+
+def normalize_query(query: str) -> str:
+    """Folds case, width and whitespace so trivially different phrasings share a key."""
+    text = unicodedata.normalize("NFKC", query).casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip(" .!?。！？")
+
+
+def history_fingerprint(history: Optional[list]) -> str:
+    payload = json.dumps(
+        [(m.get("role"), m.get("content")) for m in history or []],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class AnalyzeCache:
+    """
+    Two-tier cache for analyze_intent responses: an in-memory LRU/TTL tier
+    in front of an SQLite tier that survives restarts and is shared by workers.
+    """
+
+    def __init__(self):
+        self.memory = TTLCache(
+            maxsize=settings.analyze_cache_size, ttl=settings.analyze_cache_ttl
+        )
+        self.disk_hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @property
+    def enabled(self) -> bool:
+        return settings.analyze_cache
+
+    def make_key(
+        self, query: str, history: Optional[list], model: str, temperature: float
+    ) -> str:
+        raw = json.dumps(
+            [normalize_query(query), history_fingerprint(history), model, temperature],
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, key: str) -> Optional[UIResponse]:
+        cached = self.memory.get(key)
+        if cached is not None:
+            return cached
+
+        raw = await self._load(key)
+        if raw is None:
+            self.misses += 1
+            return None
+
+        self.disk_hits += 1
+        response = UIResponse.model_validate_json(raw)
+        self.memory.set(key, response)
+        return response
+
+    async def set(self, key: str, response: UIResponse):
+        self.memory.set(key, response)
+        self.writes += 1
+        await self._store(key, response.model_dump_json(), self.writes % PURGE_EVERY == 0)
+
+    @db_task
+    def _load(self, key: str) -> Optional[str]:
+        entry = AnalyzeCacheEntry.get_or_none(
+            (AnalyzeCacheEntry.key == key)
+            & (AnalyzeCacheEntry.expires_at > datetime.datetime.now())
+        )
+        return entry.response if entry else None
+
+    @db_task
+    def _store(self, key: str, response: str, purge: bool):
+        now = datetime.datetime.now()
+        AnalyzeCacheEntry.replace(
+            key=key,
+            response=response,
+            expires_at=now + datetime.timedelta(seconds=settings.analyze_cache_ttl),
+        ).execute()
+        if purge:
+            AnalyzeCacheEntry.delete().where(AnalyzeCacheEntry.expires_at <= now).execute()
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        hits = memory["hits"] + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory": memory,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+analyze_cache = AnalyzeCache()
@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+from typing import Any, Dict
+
+from mcp import types
+
+from app.core.config import settings
+from app.core.logging import logger
+
+TOOL_RESULTS_DIR = "./tempData/tool_results"
+# Built-in tool the LLM uses to page through an offloaded result
+READ_TOOL_RESULT = "read_tool_result"
+# Upper bound for a single read_tool_result page
+MAX_READ_CHARS = 8000
+
+_HANDLE = re.compile(r"^[0-9a-f]{24}$")
+
+READ_TOOL_RESULT_TOOL: Dict[str, Any] = {
+    "type": "function",
+    "function": {
+        "name": READ_TOOL_RESULT,
+        "description": (
+            "Read part of a large tool result that was stored instead of sent in "
+            "full. Use the handle from the truncated result and page with offset."
+        ),
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "handle": {"type": "string", "description": "Result handle"},
+                "offset": {
+                    "type": "integer",
+                    "description": "Character offset to start reading from",
+                    "default": 0,
+                },
+                "length": {
+                    "type": "integer",
+                    "description": f"Characters to read (max {MAX_READ_CHARS})",
+                    "default": 4000,
+                },
+            },
+            "required": ["handle"],
+        },
+    },
+}
+
+
+def _content_part_text(part: Any) -> str:
+    if isinstance(part, types.TextContent):
+        return part.text
+    if isinstance(part, (types.ImageContent, types.AudioContent)):
+        kind = "image" if isinstance(part, types.ImageContent) else "audio"
+        return f"[{kind}: {part.mimeType}, {len(part.data)} base64 chars omitted]"
+    if isinstance(part, types.EmbeddedResource):
+        resource = part.resource
+        if isinstance(resource, types.TextResourceContents):
+            return resource.text
+        return f"[binary resource: {resource.uri} ({resource.mimeType or 'unknown'})]"
+    if isinstance(part, types.ResourceLink):
+        return f"[resource link: {part.uri}]"
+    return str(part)
+
+
+def normalize_tool_result(result: Any) -> str:
+    """
+    Flattens a CallToolResult into plain text from its content parts,
+    instead of the repr of the whole model. Binary parts become short notes.
+    """
+    if not isinstance(result, types.CallToolResult):
+        return result if isinstance(result, str) else str(result)
+
+    parts = [_content_part_text(part) for part in result.content]
+    if not parts and result.structuredContent is not None:
+        parts.append(json.dumps(result.structuredContent, ensure_ascii=False))
+
+    text = "\n".join(parts)
+    if result.isError:
+        text = f"Tool error: {text}"
+    return text
+
+
+class ToolResultStore:
+    """
+    Content-addressed blob store for tool results too large to send inline.
+    Identical results share one file, named after their SHA-256.
+    """
+
+    def __init__(self, root: str = TOOL_RESULTS_DIR):
+        self.root = root
+
+    def _path(self, handle: str) -> str:
+        # Handles come back from the LLM, so never trust them as paths
+        if not _HANDLE.match(handle):
+            raise ValueError(f"Invalid result handle: {handle!r}")
+        return os.path.join(self.root, f"{handle}.txt")
+
+    def _write(self, handle: str, text: str):
+        path = self._path(handle)
+        if os.path.exists(path):
+            return
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+
+    def _read(self, handle: str) -> str:
+        path = self._path(handle)
+        if not os.path.exists(path):
+            raise ValueError(f"Unknown result handle: {handle}")
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    async def put(self, text: str) -> str:
+        handle = hashlib.sha256(text.encode()).hexdigest()[:24]
+        await asyncio.to_thread(self._write, handle, text)
+        return handle
+
+    async def prepare(self, text: str) -> str:
+        """
+        Returns the text to send to the LLM: the whole result if it is small,
+        otherwise a preview and a handle for read_tool_result.
+        """
+        if len(text) <= settings.tool_result_inline_chars:
+            return text
+
+        handle = await self.put(text)
+        preview = text[: settings.tool_result_preview_chars]
+        logger.info(f"Stored {len(text)} char tool result as {handle}")
+        return (
+            f"{preview}\n\n[Showing {len(preview)} of {len(text)} characters. "
+            f'The full result is stored as handle "{handle}"; call '
+            f"{READ_TOOL_RESULT} with offset={len(preview)} to read more.]"
+        )
+
+    async def read(self, handle: str, offset: int = 0, length: int = 4000) -> str:
+        text = await asyncio.to_thread(self._read, handle)
+        offset = max(0, offset)
+        end = min(len(text), offset + max(1, min(length, MAX_READ_CHARS)))
+        page = text[offset:end]
+        more = f"; continue with offset={end}" if end < len(text) else ""
+        return f"[Characters {offset}-{end} of {len(text)}{more}]\n{page}"
+
+
+tool_result_store = ToolResultStore()
@@ -0,0 +1,69 @@
+import json
+from typing import Any, Dict, Optional, Union
+
+from app.models.ui_protocol import UIResponse, ui_response_adapter
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+_decoder = json.JSONDecoder()
+
+
+def find_json_start(text: str) -> int:
+    """Index of the first '{' outside <think> blocks, or -1."""
+    pos = 0
+    while True:
+        start = text.find("{", pos)
+        think = text.find(THINK_OPEN, pos, start if start != -1 else len(text))
+        if think == -1:
+            return start
+        end = text.find(THINK_CLOSE, think)
+        if end == -1:
+            return -1  # The reply is still reasoning
+        pos = end + len(THINK_CLOSE)
+
+
+def extract_json_object(text: str) -> Optional[Any]:
+    """
+    Parses the first top-level JSON object in an LLM reply in one linear pass.
+    <think> blocks are skipped, and markdown fences or trailing prose need no
+    handling because decoding stops at the brace that closes the object.
+    """
+    start = find_json_start(text)
+    if start == -1:
+        return None
+    try:
+        return _decoder.raw_decode(text, start)[0]
+    except ValueError:
+        # Malformed reply: fall back to everything up to the last brace
+        end = text.rfind("}")
+        return json.loads(text[start : end + 1]) if end > start else None
+
+
+def decode_ui_response(text: str) -> UIResponse:
+    """Extracts and validates the UIResponse in an LLM reply."""
+    data = extract_json_object(text)
+    if data is None:
+        raise ValueError("No JSON object found in LLM reply")
+    return ui_response_adapter.validate_python(data)
+
+
+def decode_stored_content(content: str) -> Union[UIResponse, Dict[str, Any], str]:
+    """
+    Classifies message text, as stored before content_type existed: assistant
+    forms become UIResponse, other JSON objects stay dicts and everything else
+    is plain text.
+    """
+    if not content.startswith("{"):
+        return content
+    try:
+        response = ui_response_adapter.validate_json(content)
+        # Any object would validate (all fields are optional), so require one
+        if response.model_fields_set:
+            return response
+    except ValueError:
+        pass
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content
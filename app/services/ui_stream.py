@@ -0,0 +1,160 @@
+import json
+from typing import Any, List, Optional, Tuple
+
+from app.models.ui_protocol import ComponentType, component_adapter
+from app.services.ui_decoder import THINK_CLOSE, THINK_OPEN
+
+
+class UIStreamParser:
+    """
+    Incremental parser for a streamed UIResponse reply.
+
+    Chunks from the LLM are fed in as they arrive. Text before the first
+    top-level '{' (reasoning <think> blocks, markdown fences) is skipped.
+    Every object inside the top-level "components" array is emitted as soon
+    as it closes, and the "message" string is emitted as decoded deltas.
+    """
+
+    def __init__(self):
+        self.done = False
+        self._chars: List[str] = []  # Characters of the top-level JSON object
+        self._tail = ""  # Rolling window used to spot <think> tags
+        self._in_think = False
+        self._stack: List[str] = []  # Open containers: '{' or '['
+        self._in_string = False
+        self._escape = ""  # Pending escape sequence inside a string
+        self._high_surrogate = ""  # First half of a \uXXXX\uXXXX pair
+        self._string_chars: List[str] = []  # Current top-level string
+        self._expect_key = False
+        self._key: Optional[str] = None
+        self._string_is_key = False
+        self._streaming_message = False
+        self._component_start: Optional[int] = None
+
+    @property
+    def text(self) -> str:
+        """The raw JSON object collected so far."""
+        return "".join(self._chars)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Consume a chunk and return the events it completed, as a list of
+        ("component", ComponentType) and ("message", str) tuples.
+        """
+        events: List[Tuple[str, Any]] = []
+        message_delta: List[str] = []
+
+        for ch in chunk:
+            if self.done:
+                break
+            if not self._stack:
+                self._scan_preamble(ch)
+                continue
+
+            self._chars.append(ch)
+            if self._in_string:
+                self._consume_string_char(ch, message_delta)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_is_key = len(self._stack) == 1 and self._expect_key
+                self._streaming_message = (
+                    len(self._stack) == 1
+                    and not self._expect_key
+                    and self._key == "message"
+                )
+                self._string_chars = []
+            elif ch in "{[":
+                if (
+                    ch == "{"
+                    and self._stack == ["{", "["]
+                    and self._key == "components"
+                ):
+                    self._component_start = len(self._chars) - 1
+                self._stack.append(ch)
+            elif ch in "}]":
+                self._stack.pop()
+                if (
+                    ch == "}"
+                    and self._component_start is not None
+                    and self._stack == ["{", "["]
+                ):
+                    component = self._parse_component(
+                        "".join(self._chars[self._component_start :])
+                    )
+                    self._component_start = None
+                    if component is not None:
+                        if message_delta:
+                            events.append(("message", "".join(message_delta)))
+                            message_delta = []
+                        events.append(("component", component))
+                if not self._stack:
+                    self.done = True
+            elif len(self._stack) == 1:
+                if ch == ",":
+                    self._expect_key = True
+                elif ch == ":":
+                    self._expect_key = False
+
+        if message_delta:
+            events.append(("message", "".join(message_delta)))
+        return events
+
+    def _scan_preamble(self, ch: str):
+        # Skip everything up to the first '{' that is not inside a <think> block
+        self._tail = (self._tail + ch)[-len(THINK_CLOSE) :]
+        if self._in_think:
+            if self._tail.endswith(THINK_CLOSE):
+                self._in_think = False
+        elif self._tail.endswith(THINK_OPEN):
+            self._in_think = True
+        elif ch == "{":
+            self._chars.append(ch)
+            self._stack.append(ch)
+            self._expect_key = True
+
+    def _consume_string_char(self, ch: str, message_delta: List[str]):
+        if self._escape:
+            self._escape += ch
+            if not self._escape_complete():
+                return
+            decoded = json.loads(f'"{self._escape}"')
+            self._escape = ""
+            if "\ud800" <= decoded < "\udc00":
+                self._high_surrogate = decoded
+                return
+        elif ch == "\\":
+            self._escape = ch
+            return
+        elif ch == '"':
+            self._in_string = False
+            if self._string_is_key:
+                self._key = "".join(self._string_chars)
+            self._streaming_message = False
+            return
+        else:
+            decoded = ch
+
+        if self._high_surrogate:
+            decoded = (self._high_surrogate + decoded).encode(
+                "utf-16", "surrogatepass"
+            ).decode("utf-16", "replace")
+            self._high_surrogate = ""
+
+        if self._string_is_key:
+            self._string_chars.append(decoded)
+        elif self._streaming_message:
+            message_delta.append(decoded)
+
+    def _escape_complete(self) -> bool:
+        esc = self._escape
+        return len(esc) >= 2 and (esc[1] != "u" or len(esc) == 6)
+
+    @staticmethod
+    def _parse_component(raw: str) -> Optional[ComponentType]:
+        try:
+            return component_adapter.validate_python(json.loads(raw))
+        except Exception:
+            # Leave invalid components to the final UIResponse validation
+            return None
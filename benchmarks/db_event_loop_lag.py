@@ -0,0 +1,181 @@
+"""
+Event-loop lag under concurrent /analyze database load.
+
+Replays the database work of an /analyze request (chat lookup, user message
+insert, history fetch, simulated LLM wait, assistant message insert) from many
+concurrent coroutines while a probe measures how late the event loop wakes up.
+
+    python benchmarks/db_event_loop_lag.py --concurrency 50 --requests 500
+
+`inline` runs the queries directly on the event loop (the old behaviour),
+`pool` runs them through the DB thread pool. Results are printed as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def prepare_workdir() -> str:
+    # The app reads ./config.toml and writes ./tempData/genui.db relative to the cwd
+    workdir = tempfile.mkdtemp(prefix="genui-bench-")
+    with open(os.path.join(workdir, "config.toml"), "w", encoding="utf-8") as f:
+        f.write('api = "http://127.0.0.1:9/v1"\nsecret = "bench"\nmodel = "bench"\n')
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    return workdir
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def probe_lag(stop: asyncio.Event, interval: float, samples: list):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+async def run_mode(mode, chats, user, args):
+    from app.services.chat_store import chat_store, chat_writer
+
+    def call(method, *a, **kw):
+        if mode == "inline":
+            return _done(method.sync(chat_store, *a, **kw))
+        return method(*a, **kw)
+
+    async def write_inline(op, *keys):
+        chat_writer._write_batch([op])
+
+    # Inserts go through the writer; inline, it commits on the event loop
+    if mode == "inline":
+        chat_writer.write = write_inline
+
+    async def one_request(i):
+        chat = await call(chat_store.get_chat, chats[i % len(chats)].id, user)
+        await chat_store.add_user_query(chat, f"query {i}")
+        await call(chat_store._recent_messages, chat, limit=10, offset=1)
+        await asyncio.sleep(args.llm_latency)
+        await chat_store.add_message(chat, "assistant", ASSISTANT_PAYLOAD)
+
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(i):
+        async with semaphore:
+            started = time.perf_counter()
+            await one_request(i)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies: list = []
+    samples: list = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(probe_lag(stop, args.probe_interval, samples))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    await probe
+    if mode == "inline":
+        del chat_writer.write  # Back to the WriteBehindQueue method
+
+    return {
+        "mode": mode,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+        },
+        "loop_lag_ms": {
+            "mean": round(statistics.fmean(samples), 2) if samples else 0.0,
+            "p99": round(percentile(samples, 99), 2),
+            "max": round(max(samples), 2) if samples else 0.0,
+        },
+    }
+
+
+async def _done(value):
+    return value
+
+
+ASSISTANT_PAYLOAD = json.dumps(
+    {
+        "components": [
+            {"id": f"field{i}", "type": "Input", "label": f"Field {i}"}
+            for i in range(20)
+        ],
+        "message": None,
+    }
+)
+
+
+def seed(args):
+    from app.core.database import Chat, Message, User, db, init_db
+
+    init_db()
+    user = User.create(username="bench", password_hash="-")
+
+    chats = []
+    with db.atomic():
+        for c in range(args.chats):
+            chat = Chat.create(user=user, title=f"chat {c}")
+            Message.insert_many(
+                [
+                    {"chat": chat, "role": "user", "content": f"seed {m}"}
+                    for m in range(args.seed_messages)
+                ]
+            ).execute()
+            chats.append(chat)
+    db.close()
+    return user, chats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--seed-messages", type=int, default=2000)
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+
+    prepare_workdir()
+    user, chats = seed(args)
+
+    results = [
+        asyncio.run(run_mode(mode, chats, user, args)) for mode in ("inline", "pool")
+    ]
+
+    from app.core.database import shutdown_db
+
+    shutdown_db()
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
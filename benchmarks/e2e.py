@@ -0,0 +1,296 @@
+"""
+End-to-end throughput, latency and event-loop lag of the API.
+
+Starts benchmarks/fake_openai.py as the LLM and benchmarks/fake_mcp.py as the
+only MCP server, serves the app with uvicorn in a background thread and drives
+/login, /analyze, /execute and /history at each concurrency level. Everything
+runs locally, so no network access or API keys are needed.
+
+    python benchmarks/e2e.py --concurrency 1,10,50 --requests 200 --output e2e.json
+
+Event-loop lag is sampled inside the app's own loop while each scenario runs.
+Results are printed as JSON.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import httpx
+except ImportError:  # Newer openai releases depend on httpx2 instead
+    import httpx2 as httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.join(ROOT, "benchmarks")
+
+ENDPOINTS = ("/login", "/analyze", "/execute", "/history")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port: int, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
+
+
+def prepare_workdir(args, llm_port: int) -> str:
+    # The app reads ./config.toml and ./mcp_config.json and writes ./tempData
+    workdir = tempfile.mkdtemp(prefix="genui-e2e-")
+    with open(os.path.join(workdir, "config.toml"), "w", encoding="utf-8") as f:
+        f.write(
+            f'api = "http://127.0.0.1:{llm_port}/v1"\n'
+            'secret = "bench"\nmodel = "bench"\nmax_tokens = 1000\n'
+            "mcp_startup_wait = 60\n"
+            f"db_write_behind = {str(args.write_behind).lower()}\n"
+        )
+    mcp_config = {
+        "mcpServers": {
+            "bench": {
+                "command": sys.executable,
+                "args": [
+                    os.path.join(BENCH_DIR, "fake_mcp.py"),
+                    "--latency", str(args.tool_latency),
+                    "--payload", str(args.tool_payload),
+                ],
+            }
+        }
+    }
+    with open(os.path.join(workdir, "mcp_config.json"), "w", encoding="utf-8") as f:
+        json.dump(mcp_config, f)
+    os.makedirs(os.path.join(workdir, "static"), exist_ok=True)
+    os.chdir(workdir)
+    sys.path.insert(0, ROOT)
+    return workdir
+
+
+def start_fake_llm(args, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, os.path.join(BENCH_DIR, "fake_openai.py"),
+        "--port", str(port),
+        "--ttft", str(args.ttft),
+        "--token-latency", str(args.token_latency),
+    ]
+    if args.script:
+        command += ["--script", args.script]
+    process = subprocess.Popen(command)
+    wait_for_port(port)
+    return process
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LagProbe:
+    """Samples how late the app's event loop wakes up, as (timestamp, lag_ms)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.samples: list = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append((time.perf_counter(), (loop.time() - start - self.interval) * 1000))
+
+    def between(self, start: float, end: float) -> list:
+        return [lag for at, lag in list(self.samples) if start <= at <= end]
+
+
+def start_app(port: int, probe: LagProbe):
+    import uvicorn
+
+    from app.main import app
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+
+    async def serve():
+        probe_task = asyncio.create_task(probe.run())
+        await server.serve()
+        probe_task.cancel()
+
+    thread = threading.Thread(target=lambda: asyncio.run(serve()), daemon=True)
+    thread.start()
+    wait_for_port(port, timeout=120)
+    return server, thread
+
+
+class Scenarios:
+    """Request builders for each endpoint; setup requests are not measured."""
+
+    def __init__(self, client, chats: int):
+        self.client = client
+        self.chats = chats
+        self.headers: dict = {}
+        self.chat_ids: list = []
+
+    async def setup(self):
+        r = await self.client.post("/login", json={"username": "bench", "password": "bench"})
+        self.headers = {"Authorization": r.json()["token"]}
+        for _ in range(self.chats):
+            r = await self.client.post("/chat", headers=self.headers)
+            self.chat_ids.append(r.json()["chatId"])
+
+    def chat(self, i: int) -> str:
+        return self.chat_ids[i % len(self.chat_ids)]
+
+    def request(self, endpoint: str, i: int):
+        if endpoint == "/login":
+            # Separate users, so the token used by the other scenarios stays valid
+            body = {"username": f"bench-login-{i % 100}", "password": "bench"}
+            return self.client.post("/login", json=body)
+        if endpoint == "/analyze":
+            body = {"query": f"I want to buy a laptop #{i}", "chat_id": self.chat(i)}
+            return self.client.post("/analyze", json=body, headers=self.headers)
+        if endpoint == "/execute":
+            body = {
+                "original_query": f"I want to buy a laptop #{i}",
+                "form_data": {"budget": [5000, 8000], "usage": "office"},
+                "chat_id": self.chat(i),
+            }
+            return self.client.post("/execute", json=body, headers=self.headers)
+        params = {"chat_id": self.chat(i), "range": "[1, 10]"}
+        return self.client.get("/history", params=params, headers=self.headers)
+
+
+async def run_scenario(scenarios, probe, endpoint, concurrency, requests):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: list = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await scenarios.request(endpoint, i)
+                if response.status_code != 200:
+                    errors += 1
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    finished = time.perf_counter()
+    lags = probe.between(started, finished)
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / (finished - started), 1),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+        },
+        "loop_lag_ms": {
+            "mean": round(statistics.fmean(lags), 2) if lags else 0.0,
+            "p99": round(percentile(lags, 99), 2),
+            "max": round(max(lags), 2) if lags else 0.0,
+        },
+    }
+
+
+async def run(args, app_port: int, probe: LagProbe) -> list:
+    levels = [int(c) for c in args.concurrency.split(",")]
+    endpoints = args.endpoints.split(",")
+    limits = httpx.Limits(max_connections=max(levels) + 10)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{app_port}/api/v1", timeout=300, limits=limits
+    ) as client:
+        scenarios = Scenarios(client, chats=args.chats)
+        await scenarios.setup()
+        for endpoint in endpoints:
+            await scenarios.request(endpoint, 0)  # Warm-up
+
+        results = []
+        for endpoint in endpoints:
+            for concurrency in levels:
+                result = await run_scenario(
+                    scenarios, probe, endpoint, concurrency, args.requests
+                )
+                print(
+                    f"{endpoint:<9} c={concurrency:<4} {result['throughput_rps']:>8} rps  "
+                    f"p95 {result['latency_ms']['p95']} ms  errors {result['errors']}",
+                    file=sys.stderr,
+                )
+                results.append(result)
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", default="1,10,50", help="Comma-separated levels")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per level")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS))
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Fake LLM seconds to first token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Fake LLM seconds per token")
+    parser.add_argument("--script", help="Tool-call script for the fake LLM (JSON)")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="Fake MCP seconds per call")
+    parser.add_argument("--tool-payload", type=int, default=2000, help="Fake MCP result size")
+    parser.add_argument("--probe-interval", type=float, default=0.005)
+    parser.add_argument("--write-behind", action="store_true", help="Enable db_write_behind")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    output_path = os.path.abspath(args.output) if args.output else None
+    if args.script:
+        args.script = os.path.abspath(args.script)
+
+    llm_port, app_port = free_port(), free_port()
+    llm = start_fake_llm(args, llm_port)
+    try:
+        prepare_workdir(args, llm_port)
+        probe = LagProbe(args.probe_interval)
+        server, thread = start_app(app_port, probe)
+        # Per-request INFO lines would dominate the measurements
+        logging.getLogger().setLevel(logging.WARNING)
+        try:
+            results = asyncio.run(run(args, app_port, probe))
+        finally:
+            server.should_exit = True
+            thread.join(timeout=30)
+    finally:
+        llm.terminate()
+        llm.wait()
+
+    output = json.dumps({"config": vars(args), "results": results}, indent=2)
+    print(output)
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
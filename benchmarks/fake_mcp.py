@@ -0,0 +1,40 @@
+"""
+Fake stdio MCP server for offline benchmarks.
+
+    python benchmarks/fake_mcp.py --latency 0.05 --payload 2000
+
+Offers a `search` tool that sleeps for --latency seconds and returns
+--payload characters of text, and an `echo` tool that returns at once.
+"""
+
+import argparse
+import asyncio
+
+from mcp.server.fastmcp import FastMCP
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per search call")
+    parser.add_argument("--payload", type=int, default=2000, help="Characters per search result")
+    args = parser.parse_args()
+
+    server = FastMCP("bench", log_level="WARNING")
+    filler = ("lorem ipsum dolor sit amet " * (args.payload // 27 + 1))[: args.payload]
+
+    @server.tool()
+    async def search(query: str) -> str:
+        """Searches the web for a query."""
+        await asyncio.sleep(args.latency)
+        return f"Results for {query}: {filler}"
+
+    @server.tool()
+    async def echo(text: str) -> str:
+        """Returns the text unchanged."""
+        return text
+
+    server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Fake OpenAI-compatible chat completions server for offline benchmarks.
+
+    python benchmarks/fake_openai.py --port 8911 --ttft 0.05 --token-latency 0.002
+
+Requests without tools get a UI form reply (the /analyze path). Requests with
+tools follow a tool-call script: a JSON list of turns, each either
+{"tool_calls": [{"name": "search", "arguments": {...}}]} or {"content": "..."}.
+The turn is picked by counting the assistant tool-call turns since the last
+user message, so every /execute request walks the script from the start.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+UI_REPLY = json.dumps(
+    {
+        "components": [
+            {"id": "budget", "type": "RangeSlider", "label": "Budget", "min": 0, "max": 10000, "unit": "CNY"},
+            {"id": "usage", "type": "Select", "label": "Usage", "options": [{"label": "Office", "value": "office"}, {"label": "Gaming", "value": "gaming"}]},
+            {"id": "brand", "type": "Input", "label": "Preferred brand"},
+        ],
+        "message": "Please tell me a bit more about what you need.",
+    },
+    separators=(",", ":"),
+)
+
+DEFAULT_SCRIPT = [
+    {"tool_calls": [{"name": "search", "arguments": {"query": "laptops"}}]},
+    {"content": "Here is a summary of the best matching laptops for your budget."},
+]
+
+# Characters per streamed chunk, roughly one token
+CHUNK_CHARS = 4
+
+
+def create_app(ttft: float, token_latency: float, script: list) -> FastAPI:
+    app = FastAPI()
+
+    def current_turn(messages: list) -> dict:
+        turn = 0
+        for message in reversed(messages):
+            if message.get("role") == "user":
+                break
+            if message.get("role") == "assistant" and message.get("tool_calls"):
+                turn += 1
+        return script[min(turn, len(script) - 1)]
+
+    def reply_for(body: dict):
+        if not body.get("tools"):
+            return UI_REPLY, None
+        turn = current_turn(body["messages"])
+        calls = [
+            {
+                "id": f"call_{i}",
+                "type": "function",
+                "function": {"name": c["name"], "arguments": json.dumps(c.get("arguments", {}))},
+            }
+            for i, c in enumerate(turn.get("tool_calls", []))
+        ]
+        return turn.get("content"), calls or None
+
+    def usage(content):
+        completion = len(content or "") // CHUNK_CHARS + 1
+        return {"prompt_tokens": 100, "completion_tokens": completion, "total_tokens": 100 + completion}
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        content, calls = reply_for(body)
+        base = {"id": "chatcmpl-bench", "created": int(time.time()), "model": body.get("model", "bench")}
+        finish = "tool_calls" if calls else "stop"
+
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + token_latency * (len(content or "") // CHUNK_CHARS))
+            message = {"role": "assistant", "content": content}
+            if calls:
+                message["tool_calls"] = calls
+            return JSONResponse(
+                {
+                    **base,
+                    "object": "chat.completion",
+                    "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+                    "usage": usage(content),
+                }
+            )
+
+        async def events():
+            def chunk(delta, finish_reason=None, **extra):
+                data = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra}
+                return f"data: {json.dumps(data)}\n\n"
+
+            await asyncio.sleep(ttft)
+            if calls:
+                yield chunk({"role": "assistant", "tool_calls": [{"index": i, **c} for i, c in enumerate(calls)]})
+            else:
+                for start in range(0, len(content or ""), CHUNK_CHARS):
+                    yield chunk({"content": content[start : start + CHUNK_CHARS]})
+                    await asyncio.sleep(token_latency)
+            yield chunk({}, finish, usage=usage(content))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8911)
+    parser.add_argument("--ttft", type=float, default=0.05, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.002, help="Seconds per token")
+    parser.add_argument("--script", help="JSON file with the tool-call script")
+    args = parser.parse_args()
+
+    script = DEFAULT_SCRIPT
+    if args.script:
+        with open(args.script, "r", encoding="utf-8") as f:
+            script = json.load(f)
+
+    app = create_app(args.ttft, args.token_latency, script)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark of UIResponse decoding for LLM replies with 1 to 50 components.
+
+Compares the previous pipeline (three regex passes, json.loads, then
+UIResponse(**data) against a plain Union) with decode_ui_response
+(linear-time extraction plus a cached, type-discriminated TypeAdapter).
+
+    python benchmarks/ui_decode.py --sizes 1 10 50
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+from typing import List, Optional, Union, get_args
+
+from pydantic import BaseModel
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.ui_protocol import ComponentType  # noqa: E402
+from app.services.ui_decoder import decode_ui_response  # noqa: E402
+
+# The same component models as a plain (non-discriminated) Union
+PlainComponentType = Union[get_args(get_args(ComponentType)[0])]
+
+
+class LegacyUIResponse(BaseModel):
+    components: List[PlainComponentType] = []  # type: ignore[valid-type]
+    message: Optional[str] = None
+
+
+def legacy_decode(content: str) -> LegacyUIResponse:
+    content = re.sub(r"<think>.*?</think>", "", content, flags=re.DOTALL).strip()
+    code_block_match = re.search(r"```json\s*(\{.*\})\s*```", content, re.DOTALL)
+    if code_block_match:
+        content = code_block_match.group(1)
+    else:
+        json_match = re.search(r"\{.*\}", content, re.DOTALL)
+        if json_match:
+            content = json_match.group(0)
+    return LegacyUIResponse(**json.loads(content))
+
+
+SAMPLE_COMPONENTS = [
+    {"type": "Input", "label": "Name", "placeholder": "Your name"},
+    {"type": "Select", "label": "Usage", "options": [{"label": "Office", "value": "office"}, {"label": "Gaming", "value": "gaming"}]},
+    {"type": "DatePicker", "label": "Date", "range": True},
+    {"type": "MultiSelect", "label": "Tags", "options": [{"label": "A", "value": "a"}, {"label": "B", "value": "b"}]},
+    {"type": "Button", "label": "Go", "action": "submit"},
+    {"type": "MapPin", "label": "Where", "default_lat": 31.2, "default_lng": 121.5},
+    {"type": "RangeSlider", "label": "Budget", "min": 0, "max": 10000, "unit": "CNY"},
+    {"type": "VisualPicker", "label": "Style", "options": [{"image_url": "https://example.com/a.png", "value": "a"}]},
+    {"type": "Stepper", "label": "Guests", "min": 1, "max": 10},
+    {"type": "Switch", "label": "Insurance", "default_value": True},
+]
+
+
+def make_reply(count: int) -> str:
+    # Switch (last in the Union) is the worst case for trial validation
+    components = [
+        {"id": f"c{i}", **SAMPLE_COMPONENTS[i % len(SAMPLE_COMPONENTS)]}
+        for i in range(count)
+    ]
+    body = json.dumps({"components": components, "message": "请补充以下信息"}, ensure_ascii=False)
+    reasoning = "<think>" + "The user wants {something}. " * 40 + "</think>\n"
+    return f"{reasoning}```json\n{body}\n```"
+
+
+def bench(fn, reply: str, repeat: int) -> float:
+    number = max(1, repeat)
+    best = min(timeit.repeat(lambda: fn(reply), number=number, repeat=5))
+    return best / number * 1e6  # microseconds per call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 5, 10, 25, 50])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        reply = make_reply(size)
+        assert len(decode_ui_response(reply).components) == size
+        legacy = bench(legacy_decode, reply, args.repeat)
+        current = bench(decode_ui_response, reply, args.repeat)
+        results.append(
+            {
+                "components": size,
+                "reply_bytes": len(reply.encode()),
+                "legacy_us": round(legacy, 1),
+                "decode_us": round(current, 1),
+                "speedup": round(legacy / current, 2),
+            }
+        )
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()